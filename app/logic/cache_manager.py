@@ -0,0 +1,366 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from .geo import METERS_PER_DEGREE, haversine
+from .graph_cache import Circle
+from .graph_store import FORMAT_VERSION, GRAPH_EXTENSION, GraphFormatError, read_header, temp_path
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+LOCK_DIR = "locks"
+
+# Subdirectories holding managed files, and the kind recorded for each
+MANAGED_DIRS = {"": "graph", "tiles": "tile", "ch": "ch", "alt": "alt"}
+
+# Reads refresh an entry's last access at most this often, so warm loads rarely rewrite the manifest
+TOUCH_INTERVAL_SECONDS = 60
+
+# osmnx names its HTTP response cache files after a SHA-1 of the request
+OSMNX_RESPONSE_RE = re.compile(r"^[0-9a-f]{40}\.json$")
+
+
+class FileLock:
+    """Exclusive lock on a lock file, held across processes and across threads of this one."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "a+b")
+            if os.name == "nt":
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after ten seconds; keep waiting like flock does
+                        continue
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if os.name == "nt":
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+
+
+class CacheManager:
+    """Index, disk budget and cross-process locking for the files under the cache directory.
+
+    ``manifest.json`` records every cached point-radius graph, tile and
+    preprocessing file with its kind, covered area, size, last access and
+    format version, so finding a cached graph that covers a leg never scans the
+    directory. Entries are evicted least recently used first once their total
+    size exceeds ``budget_bytes``, and stale osmnx HTTP responses are swept at
+    the same time. Every manifest update is a read-modify-write under a lock
+    file, so routing processes sharing the directory (the app, the service and
+    batch workers) keep one consistent index. A missing or outdated manifest is
+    rebuilt from the file headers.
+    """
+
+    def __init__(self, cache_dir, budget_bytes, http_max_age_seconds=None):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.http_max_age_seconds = http_max_age_seconds
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self._manifest_lock = FileLock(os.path.join(cache_dir, LOCK_DIR, "manifest.lock"))
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self.entries = {}
+
+        self.evictions = 0
+        self.http_files_removed = 0
+
+        with self._manifest_lock:
+            if not self._read_manifest():
+                self.entries = self._scan()
+                self._write_manifest()
+
+    # --- Names and locks ---
+    def name(self, path):
+        """Manifest key of a file: its path relative to the cache directory, with forward slashes."""
+        return os.path.relpath(path, self.cache_dir).replace(os.sep, "/")
+
+    def lock(self, path):
+        """Cross-process lock for creating ``path``; hold it from the existence check to the save."""
+        name = self.name(path).replace("/", "_")
+        with self._locks_guard:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = FileLock(os.path.join(self.cache_dir, LOCK_DIR, name + ".lock"))
+        return lock
+
+    # --- Manifest ---
+    def _read_manifest(self):
+        """Load the manifest into ``entries``; False if it is missing, corrupt or outdated."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get("version") != MANIFEST_VERSION:
+            return False
+        with self._lock:
+            self.entries = manifest.get("entries", {})
+            self._manifest_mtime = mtime
+        return True
+
+    def _write_manifest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = temp_path(self.manifest_path)
+        with self._lock:
+            manifest = {"version": MANIFEST_VERSION, "entries": self.entries}
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _update(self, change):
+        """Apply ``change(entries)`` to the newest manifest on disk and write it back."""
+        with self._manifest_lock:
+            if not self._read_manifest():
+                self.entries = self._scan()
+            with self._lock:
+                change(self.entries)
+            self._write_manifest()
+
+    def refresh(self):
+        """Pick up entries written by other processes since the manifest was last read."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._manifest_mtime:
+            self._read_manifest()
+
+    def _scan(self):
+        """Entries for every readable managed file, rebuilt from the file headers."""
+        entries = {}
+        for subdir, kind in MANAGED_DIRS.items():
+            directory = os.path.join(self.cache_dir, subdir)
+            try:
+                filenames = os.listdir(directory)
+            except OSError:
+                continue
+            for filename in filenames:
+                if filename.endswith(".tmp") or not os.path.isfile(os.path.join(directory, filename)):
+                    continue
+                if kind == "graph" and not filename.endswith(GRAPH_EXTENSION):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    meta = read_header(path)["meta"]
+                    # Only imported extracts carry a "source"; they stay pinned across rebuilds
+                    entry = _entry(path, kind, pinned="source" in meta, **_area_from_meta(meta))
+                except GraphFormatError:
+                    # Foreign or outdated: kept in the index so eviction removes it first
+                    entry = _entry(path, kind)
+                    entry["format"] = None
+                except OSError:
+                    continue
+                entry["last_used"] = os.path.getmtime(path)
+                entries[self.name(path)] = entry
+        if entries:
+            print(f"Indexed {len(entries)} cached file(s) in {MANIFEST_NAME}")
+        return entries
+
+    # --- Recording use ---
+    def record(self, path, kind, center=None, radius=None, bbox=None, pinned=False):
+        """Add a freshly written file to the manifest, then evict down to the budget.
+
+        ``pinned`` files (imported extracts, which may not be downloadable again)
+        are never evicted and don't count towards the budget.
+        """
+        name = self.name(path)
+        entry = _entry(path, kind, center, radius, bbox, pinned)
+        self._update(lambda entries: entries.__setitem__(name, entry))
+        self.enforce_budget(protect=(name,))
+
+    def record_many(self, kind, files, pinned=False):
+        """``record`` for many ``(path, bbox)`` files at once, in one manifest write."""
+        added = {self.name(path): _entry(path, kind, bbox=bbox, pinned=pinned) for path, bbox in files}
+        self._update(lambda entries: entries.update(added))
+        self.enforce_budget(protect=added)
+
+    def touch(self, path):
+        """Mark a file as just used; written through at most every ``TOUCH_INTERVAL_SECONDS``."""
+        name = self.name(path)
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None or now - entry["last_used"] < TOUCH_INTERVAL_SECONDS:
+                return
+
+        def change(entries):
+            if name in entries:
+                entries[name]["last_used"] = now
+        self._update(change)
+
+    def forget(self, path):
+        """Drop a file that turned out to be unreadable."""
+        name = self.name(path)
+        self._update(lambda entries: entries.pop(name, None))
+
+    # --- Lookups ---
+    def find_graph(self, region):
+        """``(path, center, radius)`` of the smallest cached point-radius graph covering ``region``."""
+        self.refresh()
+        best = None
+        with self._lock:
+            for name, entry in self.entries.items():
+                if entry["kind"] != "graph" or entry["format"] != FORMAT_VERSION:
+                    continue
+                circle = Circle(tuple(entry["center"]), entry["radius"])
+                if circle.covers(region) and (best is None or circle.radius < best[2]):
+                    best = (self.path(name), circle.center, circle.radius)
+        return best
+
+    def recent_graphs(self, center, radius_m, limit):
+        """``(path, center, radius)`` of cached point-radius graphs centred within ``radius_m``, latest used first."""
+        self.refresh()
+        with self._lock:
+            nearby = [
+                (entry["last_used"], name, entry) for name, entry in self.entries.items()
+                if entry["kind"] == "graph" and entry["format"] == FORMAT_VERSION
+                and haversine(center[0], center[1], entry["center"][0], entry["center"][1]) <= radius_m
+            ]
+        nearby.sort(key=lambda item: item[0], reverse=True)
+        return [(self.path(name), tuple(entry["center"]), entry["radius"]) for _, name, entry in nearby[:limit]]
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, *name.split("/"))
+
+    # --- Eviction ---
+    def enforce_budget(self, protect=()):
+        """Delete least recently used unpinned files (outdated formats first) until they fit the budget."""
+        evicted = []
+
+        def change(entries):
+            evictable = [name for name in entries if not entries[name].get("pinned")]
+            total = sum(entries[name]["bytes"] for name in evictable)
+            order = sorted(evictable, key=lambda name: (entries[name]["format"] == FORMAT_VERSION,
+                                                        entries[name]["last_used"]))
+            for name in order:
+                if total <= self.budget_bytes:
+                    break
+                if name in protect:
+                    continue
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # Still mapped by a reader on Windows; try again on a later pass
+                    print(f"Could not evict {name}: {e}")
+                    continue
+                total -= entries.pop(name)["bytes"]
+                evicted.append(name)
+
+        self._update(change)
+        self.evictions += len(evicted)
+        if evicted:
+            print(f"Evicted {len(evicted)} cached file(s) to stay under the disk budget")
+        self.sweep_http_cache()
+        return evicted
+
+    def sweep_http_cache(self):
+        """Remove osmnx HTTP responses and abandoned temp files older than ``http_max_age_seconds``."""
+        if self.http_max_age_seconds is None:
+            return 0
+        cutoff = time.time() - self.http_max_age_seconds
+        removed = 0
+        for subdir in MANAGED_DIRS:
+            directory = os.path.join(self.cache_dir, subdir)
+            try:
+                filenames = os.listdir(directory)
+            except OSError:
+                continue
+            for filename in filenames:
+                is_response = subdir == "" and OSMNX_RESPONSE_RE.match(filename)
+                if not (is_response or filename.endswith(".tmp")):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        self.http_files_removed += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": sum(entry["bytes"] for entry in self.entries.values()),
+                "pinned_bytes": sum(entry["bytes"] for entry in self.entries.values() if entry.get("pinned")),
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+                "http_files_removed": self.http_files_removed,
+            }
+
+
+def _entry(path, kind, center=None, radius=None, bbox=None, pinned=False):
+    if bbox is None and center is not None:
+        bbox = _circle_bbox(center, radius)
+    return {
+        "kind": kind,
+        "center": list(center) if center is not None else None,
+        "radius": radius,
+        "bbox": list(bbox) if bbox is not None else None,
+        "bytes": os.path.getsize(path),
+        "last_used": time.time(),
+        "format": FORMAT_VERSION,
+        "pinned": pinned,
+    }
+
+
+def _area_from_meta(meta):
+    """Manifest area fields from the ``meta`` a cache file was saved with."""
+    if "center" in meta:
+        return {"center": meta["center"], "radius": meta["radius"]}
+    if "tile" in meta and "tile_size" in meta:
+        row, col = meta["tile"]
+        size = meta["tile_size"]
+        return {"bbox": (row * size, col * size, (row + 1) * size, (col + 1) * size)}
+    return {}
+
+
+def _circle_bbox(center, radius):
+    """``(south, west, north, east)`` around a download circle."""
+    lat_pad = radius / METERS_PER_DEGREE
+    lon_pad = lat_pad / max(math.cos(math.radians(center[0])), 1e-6)
+    return center[0] - lat_pad, center[1] - lon_pad, center[0] + lat_pad, center[1] + lon_pad
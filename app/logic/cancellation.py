@@ -0,0 +1,60 @@
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+# Search loops check for cancellation once every this many heap pops
+CHECK_INTERVAL = 1024
+
+
+class RouteCancelled(Exception):
+    """Raised inside a routing job once its CancellationToken has been cancelled."""
+
+
+class CancellationToken:
+    """Shared flag telling a routing job (and every thread working for it) to stop."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise RouteCancelled("Route computation was cancelled")
+
+
+def current():
+    """The token of the job running on this thread, or None."""
+    return getattr(_local, "token", None)
+
+
+def check():
+    """Raise RouteCancelled if this thread's job has been cancelled; a no-op outside any job."""
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def checking(token):
+    """Make ``check()`` on this thread honour ``token`` for the duration."""
+    previous = getattr(_local, "token", None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def bind(token, fn):
+    """Wrap ``fn`` so it honours ``token`` on whichever pool thread runs it."""
+    def run(*args, **kwargs):
+        with checking(token):
+            return fn(*args, **kwargs)
+    return run
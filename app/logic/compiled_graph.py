@@ -0,0 +1,337 @@
+import hashlib
+
+import numpy as np
+
+from .spatial_index import EdgeIndex, GridIndex
+
+# Road class codes stored per edge; ``*_link`` roads share their parent's class
+ROAD_CLASSES = ("other", "motorway", "trunk", "primary", "secondary", "tertiary", "residential", "service")
+_ROAD_CLASS_CODES = {name: code for code, name in enumerate(ROAD_CLASSES)}
+
+
+def road_class_code(highway):
+    """Class code for an OSM ``highway`` tag (osmnx gives a list for merged ways)."""
+    if isinstance(highway, list):
+        codes = [road_class_code(h) for h in highway]
+        return min((c for c in codes if c), default=0)
+    if not isinstance(highway, str):
+        return 0
+    return _ROAD_CLASS_CODES.get(highway.replace("_link", ""), 0)
+
+
+class TrafficLayer:
+    """Multipliers on base travel times, applied as edges are read.
+
+    ``factor`` scales every edge. On top of it, ``per_class`` (indexed by road
+    class code) or ``per_edge`` (aligned with the graph's ``indices``) can vary
+    congestion across the network. The graph's arrays are never touched, so
+    swapping in a new snapshot is just attaching a new layer.
+    """
+
+    def __init__(self, factor=1.0, per_class=None, per_edge=None):
+        self.factor = factor
+        self.per_class = None if per_class is None else np.asarray(per_class, dtype=np.float64)
+        self.per_edge = None if per_edge is None else np.asarray(per_edge, dtype=np.float64)
+
+    @property
+    def uniform(self):
+        return self.per_class is None and self.per_edge is None
+
+    def reordered(self, order):
+        """The same layer for a graph whose edges were permuted by ``order``."""
+        if self.per_edge is None:
+            return self
+        return TrafficLayer(self.factor, per_edge=self.per_edge[order])
+
+
+class CompiledGraph:
+    """Read-only road network in compressed-sparse-row (CSR) form.
+
+    Node ids are remapped to contiguous ints ``0..n-1`` (``node_ids[i]`` is the
+    original OSM id). The outgoing edges of node ``i`` are
+    ``indices[indptr[i]:indptr[i + 1]]`` with the matching ``travel_time`` and
+    ``road_class`` entries. Parallel edges are collapsed to the fastest one.
+    Traffic is a ``TrafficLayer`` combined with ``travel_time`` in ``neighbors``;
+    ``speed_profile`` (a ``SpeedProfile``, saved with the graph) is the
+    time-of-day model used by time-dependent searches instead.
+    """
+
+    def __init__(self, node_ids, lat, lon, indptr, indices, travel_time, road_class=None, traffic=None,
+                 speed_profile=None):
+        self.node_ids = node_ids
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices
+        self.travel_time = travel_time
+        self.road_class = np.zeros(len(indices), dtype=np.uint8) if road_class is None else road_class
+        self.traffic = TrafficLayer() if traffic is None else traffic
+        self.speed_profile = speed_profile
+        # Cache file this graph was loaded from or saved to, or the tuple of tile files it
+        # was stitched from, so worker processes can map it instead of receiving a copy
+        self.source = None
+
+        # Graph this one shares its arrays with (see ``with_traffic``)
+        self._base = None
+        self._index_of = None
+        self._fingerprint = None
+        self._reverse = None
+        self._reverse_order = None
+        self._spatial_index = None
+        self._edge_index = None
+
+    @classmethod
+    def from_networkx(cls, graph, weight=None):
+        """Compile an osmnx MultiDiGraph.
+
+        If ``weight`` names an edge attribute, it becomes a per-edge traffic
+        layer over travel_time (edges without it keep their travel_time).
+        """
+        node_ids = np.fromiter(graph.nodes, dtype=np.int64, count=graph.number_of_nodes())
+        index_of = {node_id: i for i, node_id in enumerate(node_ids.tolist())}
+
+        lat = np.empty(len(node_ids), dtype=np.float64)
+        lon = np.empty(len(node_ids), dtype=np.float64)
+        for node_id, data in graph.nodes(data=True):
+            i = index_of[node_id]
+            lat[i] = data['y']
+            lon[i] = data['x']
+
+        src, dst, times, classes, weights = [], [], [], [], []
+        for u, v, data in graph.edges(data=True):
+            base_time = data.get('travel_time', 1)
+            src.append(index_of[u])
+            dst.append(index_of[v])
+            times.append(base_time)
+            classes.append(road_class_code(data.get('highway')))
+            if weight is not None:
+                weights.append(data.get(weight, base_time))
+
+        return cls.from_edges(
+            node_ids, lat, lon,
+            np.asarray(src, dtype=np.int64),
+            np.asarray(dst, dtype=np.int64),
+            np.asarray(times, dtype=np.float64),
+            np.asarray(classes, dtype=np.uint8),
+            np.asarray(weights, dtype=np.float64) if weight is not None else None,
+        )
+
+    @classmethod
+    def from_edges(cls, node_ids, lat, lon, src, dst, travel_time, road_class=None, weight=None):
+        """Build the CSR arrays from an edge list given in node-index space.
+
+        Without ``weight`` the fastest of each set of parallel edges is kept.
+        With it, the cheapest by ``weight`` is kept and ``weight / travel_time``
+        becomes the returned graph's per-edge traffic layer.
+        """
+        if road_class is None:
+            road_class = np.zeros(len(src), dtype=np.uint8)
+        cost = travel_time if weight is None else weight
+
+        # Sort by (src, dst, cost) so the first edge of each (src, dst) run is the cheapest
+        order = np.lexsort((cost, dst, src))
+        src, dst = src[order], dst[order]
+
+        keep = np.ones(len(src), dtype=bool)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        kept = order[keep]
+        src, dst = src[keep], dst[keep]
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(node_ids)), out=indptr[1:])
+
+        travel_time = travel_time[kept].astype(np.float64)
+        graph = cls(
+            node_ids, lat, lon, indptr,
+            dst.astype(np.int32),
+            travel_time,
+            road_class[kept].astype(np.uint8),
+        )
+        if weight is None:
+            return graph
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            per_edge = np.where(travel_time > 0, weight[kept] / travel_time, 1.0)
+        return graph.with_traffic(TrafficLayer(per_edge=per_edge))
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.empty(0, dtype=np.int64), np.empty(0), np.empty(0),
+            np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0),
+        )
+
+    @classmethod
+    def merge(cls, graphs):
+        """Stitch graphs together on their shared OSM node ids.
+
+        Nodes present in several inputs collapse into one, so roads that cross
+        from one graph into the next become connected.
+        """
+        graphs = [g for g in graphs if g.num_nodes]
+        if not graphs:
+            return cls.empty()
+
+        all_ids = np.concatenate([g.node_ids for g in graphs])
+        node_ids, first = np.unique(all_ids, return_index=True)
+        lat = np.concatenate([g.lat for g in graphs])[first]
+        lon = np.concatenate([g.lon for g in graphs])[first]
+
+        src, dst, times, classes = [], [], [], []
+        for g in graphs:
+            local_to_global = np.searchsorted(node_ids, g.node_ids)
+            src.append(local_to_global[np.repeat(np.arange(g.num_nodes), np.diff(g.indptr))])
+            dst.append(local_to_global[g.indices])
+            times.append(g.travel_time)
+            classes.append(g.road_class)
+
+        merged = cls.from_edges(
+            node_ids, lat, lon,
+            np.concatenate(src), np.concatenate(dst),
+            np.concatenate(times), np.concatenate(classes),
+        )
+        # Tiles compiled at different times may carry different profiles; the first one wins
+        merged.speed_profile = next((g.speed_profile for g in graphs if g.speed_profile is not None), None)
+        sources = [g.source for g in graphs]
+        if all(isinstance(source, str) for source in sources):
+            merged.source = tuple(sources)
+        return merged
+
+    def with_traffic(self, traffic):
+        """Same arrays under a different traffic layer; nothing is copied."""
+        base = self._base if self._base is not None else self
+        graph = CompiledGraph(
+            base.node_ids, base.lat, base.lon, base.indptr, base.indices,
+            base.travel_time, base.road_class, traffic, base.speed_profile,
+        )
+        graph._base = base
+        graph.source = base.source
+        return graph
+
+    def scaled(self, factor):
+        """Base travel times multiplied by one traffic factor for the whole graph."""
+        return self.with_traffic(TrafficLayer(factor))
+
+    @property
+    def weight_scale(self):
+        """The single traffic factor when the layer is uniform, else None."""
+        return self.traffic.factor if self.traffic.uniform else None
+
+    def reverse(self):
+        """The graph with every edge flipped, for searches that run towards a target."""
+        if self._reverse is None:
+            if self._base is not None:
+                base = self._base
+                base.reverse()
+                self._reverse = base._reverse.with_traffic(self.traffic.reordered(base._reverse_order))
+            else:
+                # Edges are sorted by source, so a stable sort on target keeps sources ordered
+                order = np.argsort(self.indices, kind="stable")
+                src = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+                indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+                np.cumsum(np.bincount(self.indices, minlength=self.num_nodes), out=indptr[1:])
+                self._reverse = CompiledGraph(
+                    self.node_ids, self.lat, self.lon, indptr, src[order],
+                    self.travel_time[order], self.road_class[order], self.traffic.reordered(order),
+                )
+                self._reverse_order = order
+        return self._reverse
+
+    def fingerprint(self):
+        """Digest of the topology and base travel times, used to key derived data on disk."""
+        if self._base is not None:
+            return self._base.fingerprint()
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for array in (self.node_ids, self.indptr, self.indices, self.travel_time):
+                digest.update(np.ascontiguousarray(array).data)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __getstate__(self):
+        # Ship only the arrays to worker processes; lookup tables are rebuilt there on demand
+        return {
+            "arrays": (self.node_ids, self.lat, self.lon, self.indptr, self.indices,
+                       self.travel_time, self.road_class),
+            "traffic": self.traffic,
+            "speed_profile": self.speed_profile,
+            "fingerprint": self.fingerprint(),
+        }
+
+    def __setstate__(self, state):
+        self.__init__(*state["arrays"], traffic=state["traffic"], speed_profile=state.get("speed_profile"))
+        self._fingerprint = state["fingerprint"]
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        arrays = (self.node_ids, self.lat, self.lon, self.indptr, self.indices,
+                  self.travel_time, self.road_class)
+        total = sum(a.nbytes for a in arrays)
+        for layer_array in (self.traffic.per_class, self.traffic.per_edge):
+            if layer_array is not None:
+                total += layer_array.nbytes
+        return total
+
+    def index_of(self, node_id):
+        """Map an OSM node id to its contiguous index."""
+        if self._base is not None:
+            return self._base.index_of(node_id)
+        if self._index_of is None:
+            self._index_of = {node_id: i for i, node_id in enumerate(self.node_ids.tolist())}
+        return self._index_of[node_id]
+
+    def neighbors(self, index):
+        """``(neighbor, weight)`` pairs for the outgoing edges of a node, traffic applied.
+
+        Slices the CSR arrays per node, so a search over a memory-mapped graph
+        only ever touches the pages for the nodes it expands.
+        """
+        start, end = self.indptr[index], self.indptr[index + 1]
+        times = self.travel_time[start:end]
+
+        # Apply the traffic layer to just these edges
+        traffic = self.traffic
+        if traffic.per_edge is not None:
+            times = times * traffic.per_edge[start:end]
+        elif traffic.per_class is not None:
+            times = times * traffic.per_class[self.road_class[start:end]]
+        if traffic.factor != 1.0:
+            times = times * traffic.factor
+        return zip(self.indices[start:end].tolist(), times.tolist())
+
+    def timed_neighbors(self, index):
+        """``(neighbor, base travel time, road class)`` per outgoing edge, for time-dependent searches."""
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return zip(self.indices[start:end].tolist(), self.travel_time[start:end].tolist(),
+                   self.road_class[start:end].tolist())
+
+    def spatial_index(self):
+        """Grid over node coordinates, built on first use (or loaded with the graph)."""
+        if self._base is not None:
+            return self._base.spatial_index()
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex.build(self.lat, self.lon)
+        return self._spatial_index
+
+    def edge_index(self):
+        """Grid over edge midpoints for nearest-edge snapping, built on first use."""
+        if self._base is not None:
+            return self._base.edge_index()
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self)
+        return self._edge_index
+
+    def nearest_node(self, lat, lon):
+        """Index of the node closest to ``(lat, lon)``, or -1 on an empty graph."""
+        return self.spatial_index().nearest(self.lat, self.lon, lat, lon)[0]
+
+    def coords(self, index):
+        return float(self.lat[index]), float(self.lon[index])
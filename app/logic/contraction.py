@@ -0,0 +1,290 @@
+import heapq
+
+import numpy as np
+
+from .graph_store import load_arrays, save_arrays
+
+CH_EXTENSION = ".ch"
+
+# Witness searches give up after settling this many nodes; a missed witness only
+# costs a redundant shortcut, never a wrong answer.
+WITNESS_SETTLE_LIMIT = 60
+
+_ARRAYS = (
+    "rank",
+    "up_indptr", "up_indices", "up_weight", "up_middle",
+    "down_indptr", "down_indices", "down_weight", "down_middle",
+)
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy over a CompiledGraph's base ``travel_time``.
+
+    ``up`` holds, per node, the edges leading to higher-ranked nodes; ``down``
+    holds, per node, the higher-ranked nodes that have an edge *into* it, which
+    is what the backward search climbs. ``*_middle`` is the contracted node a
+    shortcut bypasses, or -1 for an original road edge.
+    """
+
+    def __init__(self, fingerprint, rank,
+                 up_indptr, up_indices, up_weight, up_middle,
+                 down_indptr, down_indices, down_weight, down_middle):
+        self.fingerprint = fingerprint
+        self.rank = rank
+        self.up = (up_indptr, up_indices, up_weight, up_middle)
+        self.down = (down_indptr, down_indices, down_weight, down_middle)
+        self._lists = None
+
+    def is_valid_for(self, graph):
+        """Usable only if the topology and base times match and traffic is a uniform scale."""
+        return graph.weight_scale is not None and graph.fingerprint() == self.fingerprint
+
+    # --- Preprocessing ---
+    @classmethod
+    def build(cls, graph):
+        n = graph.num_nodes
+        out_adj = [dict() for _ in range(n)]
+        in_adj = [dict() for _ in range(n)]
+        for u in range(n):
+            start, end = graph.indptr[u], graph.indptr[u + 1]
+            for v, w in zip(graph.indices[start:end].tolist(), graph.travel_time[start:end].tolist()):
+                if u != v:
+                    out_adj[u][v] = (w, -1)
+                    in_adj[v][u] = (w, -1)
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+        level = [0] * n
+        rank = np.zeros(n, dtype=np.int32)
+        up_edges = []
+        down_edges = []
+
+        def simulate(v):
+            """Priority of contracting ``v`` now, and the shortcuts ``(u, x, weight)`` it needs."""
+            shortcuts = []
+            for u, (w_in, _) in in_adj[v].items():
+                targets = {x: w_in + w_out for x, (w_out, _) in out_adj[v].items() if x != u}
+                if not targets:
+                    continue
+                witness = _witness_search(out_adj, u, v, targets, max(targets.values()))
+                for x, via in targets.items():
+                    if witness.get(x, float('inf')) > via:
+                        shortcuts.append((u, x, via))
+
+            # Edge difference keeps the overlay sparse; deleted neighbours and level
+            # spread contraction evenly so upward searches stay shallow
+            edge_difference = len(shortcuts) - len(in_adj[v]) - len(out_adj[v])
+            return 2 * edge_difference + deleted_neighbors[v] + level[v], shortcuts
+
+        queue = [(simulate(v)[0], v) for v in range(n)]
+        heapq.heapify(queue)
+
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if contracted[v]:
+                continue
+
+            # Lazy update: re-evaluate and put back if it is no longer the cheapest
+            current, shortcuts = simulate(v)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+            for x, (w, middle) in out_adj[v].items():
+                up_edges.append((v, x, w, middle))
+                del in_adj[x][v]
+                deleted_neighbors[x] += 1
+                level[x] = max(level[x], level[v] + 1)
+            for u, (w, middle) in in_adj[v].items():
+                down_edges.append((v, u, w, middle))
+                del out_adj[u][v]
+                deleted_neighbors[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            out_adj[v] = {}
+            in_adj[v] = {}
+
+            for u, x, via in shortcuts:
+                if via < out_adj[u].get(x, (float('inf'),))[0]:
+                    out_adj[u][x] = (via, v)
+                    in_adj[x][u] = (via, v)
+
+        return cls(graph.fingerprint(), rank, *_to_csr(n, up_edges), *_to_csr(n, down_edges))
+
+    # --- Persistence ---
+    def save(self, path):
+        arrays = dict(zip(_ARRAYS, (self.rank,) + self.up + self.down))
+        save_arrays(path, arrays, meta={"fingerprint": self.fingerprint})
+
+    @classmethod
+    def load(cls, path):
+        arrays, meta = load_arrays(path)
+        return cls(meta["fingerprint"], *(arrays[name] for name in _ARRAYS))
+
+    # --- Query ---
+    def query(self, source, target):
+        """``(node-index path, base travel time)`` from ``source`` to ``target``, or None."""
+        if source == target:
+            return [source], 0.0
+
+        up, down = self._adjacency_lists()
+        searches = (
+            _Search(up, down, source),
+            _Search(down, up, target),
+        )
+        best, meeting = float('inf'), None
+
+        while True:
+            # Stop once neither frontier can still improve on the best meeting point
+            active = [s for s in searches if s.heap and s.heap[0][0] < best]
+            if not active:
+                break
+            search = min(active, key=lambda s: s.heap[0][0])
+            other = searches[1] if search is searches[0] else searches[0]
+
+            node = search.settle_next()
+            if node is None:
+                continue
+            if node in other.dist:
+                total = search.dist[node] + other.dist[node]
+                if total < best:
+                    best, meeting = total, node
+
+        if meeting is None:
+            return None
+
+        forward, backward = searches
+        segments = []
+        node = meeting
+        while node != source:
+            prev, middle = forward.parent[node]
+            segments.append(self._unpack(prev, node, middle)[:-1])
+            node = prev
+        path = [n for segment in reversed(segments) for n in segment]
+        path.append(meeting)
+
+        node = meeting
+        while node != target:
+            nxt, middle = backward.parent[node]
+            path.extend(self._unpack(node, nxt, middle)[1:])
+            node = nxt
+        return path, best
+
+    def _adjacency_lists(self):
+        """Per-node ``[(other, weight, middle), ...]`` lists for both directions.
+
+        Built once per loaded hierarchy: the query settles only a few hundred
+        nodes, so per-node ndarray slicing would dominate its running time.
+        """
+        if self._lists is None:
+            self._lists = tuple(_to_lists(*edges) for edges in (self.up, self.down))
+        return self._lists
+
+    def _middle_of(self, u, v):
+        """Middle node of the hierarchy edge ``u -> v``."""
+        up, down = self._adjacency_lists()
+        if self.rank[u] < self.rank[v]:
+            owner, other, edges = u, v, up
+        else:
+            owner, other, edges = v, u, down
+        for neighbor, _, middle in edges[owner]:
+            if neighbor == other:
+                return middle
+        raise KeyError((u, v))
+
+    def _unpack(self, u, v, middle):
+        """Expand the hierarchy edge ``u -> v`` into original road nodes ``[u, ..., v]``."""
+        path = [u]
+        stack = [(u, v, middle)]
+        while stack:
+            a, b, mid = stack.pop()
+            if mid < 0:
+                path.append(b)
+            else:
+                # Push the second half first so the first half is expanded first
+                stack.append((mid, b, self._middle_of(mid, b)))
+                stack.append((a, mid, self._middle_of(a, mid)))
+        return path
+
+
+class _Search:
+    """One direction of the CH query: Dijkstra restricted to upward edges.
+
+    ``stall_edges`` are the same upward edges seen from the other side; if one
+    of them proves a node was reached suboptimally, the node is not expanded
+    (stall-on-demand), which prunes most of the upward search space.
+    """
+
+    def __init__(self, edges, stall_edges, root):
+        self.edges = edges
+        self.stall_edges = stall_edges
+        self.dist = {root: 0.0}
+        self.parent = {}
+        self.heap = [(0.0, root)]
+        self.settled = 0
+
+    def settle_next(self):
+        d, node = heapq.heappop(self.heap)
+        if d > self.dist[node]:
+            return None
+        self.settled += 1
+
+        for higher, w, _ in self.stall_edges[node]:
+            if self.dist.get(higher, float('inf')) + w < d:
+                return node
+
+        for neighbor, w, middle in self.edges[node]:
+            nd = d + w
+            if nd < self.dist.get(neighbor, float('inf')):
+                self.dist[neighbor] = nd
+                self.parent[neighbor] = (node, middle)
+                heapq.heappush(self.heap, (nd, neighbor))
+        return node
+
+
+def _witness_search(out_adj, source, skip, targets, limit):
+    """Bounded Dijkstra from ``source`` that avoids ``skip``; returns distances found."""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    remaining = set(targets)
+    settled = 0
+    while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        remaining.discard(node)
+        for neighbor, (w, _) in out_adj[node].items():
+            if neighbor == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(neighbor, float('inf')):
+                dist[neighbor] = nd
+                heapq.heappush(heap, (nd, neighbor))
+    return dist
+
+
+def _to_csr(n, edges):
+    """``(owner, other, weight, middle)`` tuples to CSR arrays indexed by owner."""
+    edges.sort(key=lambda e: e[0])
+    owners = np.fromiter((e[0] for e in edges), dtype=np.int64, count=len(edges))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=n), out=indptr[1:])
+    return (
+        indptr,
+        np.fromiter((e[1] for e in edges), dtype=np.int32, count=len(edges)),
+        np.fromiter((e[2] for e in edges), dtype=np.float64, count=len(edges)),
+        np.fromiter((e[3] for e in edges), dtype=np.int32, count=len(edges)),
+    )
+
+
+def _to_lists(indptr, indices, weights, middles):
+    edges = list(zip(indices.tolist(), weights.tolist(), middles.tolist()))
+    bounds = indptr.tolist()
+    return [edges[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+
+# Same mean Earth radius geopy's great_circle uses, so distances match the old calls
+EARTH_RADIUS_M = 6371009.0
+
+# Meters in one degree of latitude (or of longitude at the equator)
+METERS_PER_DEGREE = math.radians(1.0) * EARTH_RADIUS_M
+
+# Fastest speed assumed on any road; keeps the straight-line heuristic a lower bound
+MAX_SPEED_MPS = 28.0
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between scalar coordinates."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_array(lat1, lon1, lat2, lon2):
+    """Vectorised great-circle distance in meters; arguments broadcast like NumPy ufuncs."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_to_point(lats, lons, lat, lon):
+    """Distance in meters from every ``(lats[i], lons[i])`` to one point."""
+    return haversine_array(lats, lons, lat, lon)
+
+
+def travel_time_bound(graph, index, speed=MAX_SPEED_MPS):
+    """Straight-line seconds from every node of ``graph`` to node ``index``."""
+    return haversine_to_point(graph.lat, graph.lon, graph.lat[index], graph.lon[index]) / speed
+
+
+def point_to_segments(lat, lon, lat1, lon1, lat2, lon2):
+    """Distance in meters from one point to many short segments, and where it lands on each.
+
+    Uses a local equirectangular projection around the point, which is accurate
+    to well under a meter over the few kilometers a road edge spans. Returns
+    ``(distance, t)`` where ``t`` in ``[0, 1]`` is the position along each segment.
+    """
+    meters_lat = METERS_PER_DEGREE
+    meters_lon = meters_lat * math.cos(math.radians(lat))
+    ax, ay = (np.asarray(lon1) - lon) * meters_lon, (np.asarray(lat1) - lat) * meters_lat
+    bx, by = (np.asarray(lon2) - lon) * meters_lon, (np.asarray(lat2) - lat) * meters_lat
+
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(length_sq > 0, -(ax * dx + ay * dy) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(ax + t * dx, ay + t * dy), t
@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import config
+
+# Google returns at most this many predictions; a shorter list is everything that matches
+AUTOCOMPLETE_PAGE_SIZE = 5
+
+
+class GeocodingProvider:
+    """Source of coordinates and address suggestions.
+
+    ``geocode(address)`` returns ``(lat, lng)`` or None when the address is
+    unknown, and ``autocomplete(query)`` a list of suggestion strings.
+    """
+
+    def geocode(self, address):
+        raise NotImplementedError
+
+    def autocomplete(self, query):
+        raise NotImplementedError
+
+
+class GoogleGeocodingProvider(GeocodingProvider):
+    """Geocoding and Places autocomplete through the Google Maps API."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._gmaps = None
+
+    @property
+    def gmaps(self):
+        # Created on first use, so nothing touches googlemaps until the user searches
+        if self._gmaps is None:
+            import googlemaps
+            self._gmaps = googlemaps.Client(key=self.api_key)
+        return self._gmaps
+
+    def geocode(self, address):
+        geo = self.gmaps.geocode(address)
+        if not geo:
+            return None
+        loc = geo[0]["geometry"]["location"]
+        return loc["lat"], loc["lng"]
+
+    def autocomplete(self, query):
+        return [result["description"] for result in self.gmaps.places_autocomplete(query)]
+
+
+class OfflineGeocodingProvider(GeocodingProvider):
+    """Offline stand-in backed by a JSON gazetteer::
+
+        {"places": [{"name": "Hoan Kiem Lake, Hanoi", "lat": 21.0288, "lng": 105.8525}]}
+
+    Addresses match names case-insensitively; suggestions are the names that
+    contain every word of the query.
+    """
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.places = {normalize(place["name"]): place for place in data.get("places", [])}
+
+    def geocode(self, address):
+        place = self.places.get(normalize(address))
+        return (place["lat"], place["lng"]) if place else None
+
+    def autocomplete(self, query):
+        names = [place["name"] for place in self.places.values()]
+        return [name for name in names if matches(name, query)][:AUTOCOMPLETE_PAGE_SIZE]
+
+
+def create_provider(name=None):
+    name = name or config.GEOCODER_PROVIDER
+    if name == "google":
+        return GoogleGeocodingProvider(config.GOOGLE_MAPS_API_KEY)
+    if name == "offline":
+        return OfflineGeocodingProvider(config.GEOCODER_FILE)
+    raise ValueError(f"Unknown geocoding provider: {name}")
+
+
+def normalize(text):
+    """Case- and whitespace-insensitive cache key."""
+    return " ".join(text.lower().split())
+
+
+def matches(suggestion, query):
+    suggestion = normalize(suggestion)
+    return all(word in suggestion for word in normalize(query).split())
+
+
+class GeocodingService:
+    """Cached geocoding and autocomplete in front of a GeocodingProvider.
+
+    Geocoded addresses are kept in an in-memory LRU backed by a JSON store on
+    disk, so an address is only ever sent to the provider once. Autocomplete
+    results stay in memory, and a longer query is answered from the results of
+    a prefix already seen when those can't be missing anything. Safe to call from
+    several threads; provider calls happen outside the lock.
+    """
+
+    def __init__(self, provider, store_path=None, memory_size=None):
+        self.provider = provider
+        self.store_path = os.path.join(config.CACHE_DIR, config.GEOCODE_STORE) if store_path is None else store_path
+        self.memory_size = config.GEOCODE_MEMORY_SIZE if memory_size is None else memory_size
+        self._places = OrderedDict()
+        self._suggestions = OrderedDict()
+        self._lock = threading.Lock()
+        self._store_lock = None
+        self._stored = self._load_store()
+
+        self.hits = 0
+        self.misses = 0
+        self.prefix_hits = 0
+
+    def _load_store(self):
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                return {key: tuple(value) for key, value in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_store(self, snapshot):
+        """Merge ``snapshot`` into the store on disk, keeping what other processes added to it."""
+        # Imported here so opening the window doesn't pull in numpy through the cache modules
+        from .cache_manager import LOCK_DIR, FileLock
+        from .graph_store import temp_path
+
+        with self._lock:
+            if self._store_lock is None:
+                name = os.path.basename(self.store_path) + ".lock"
+                self._store_lock = FileLock(os.path.join(os.path.dirname(self.store_path) or ".", LOCK_DIR, name))
+            store_lock = self._store_lock
+        with store_lock:
+            # Batch workers share the store: reload it so their entries survive this write
+            stored = self._load_store()
+            stored.update(snapshot)
+            # Written beside the store and renamed over it, so a crash never leaves half a file
+            tmp_path = temp_path(self.store_path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.store_path)
+        with self._lock:
+            for key, location in stored.items():
+                self._stored.setdefault(key, location)
+
+    def geocode(self, address):
+        """``(lat, lng)`` for ``address``, or None if the provider doesn't know it."""
+        key = normalize(address)
+        with self._lock:
+            location = self._remember(self._places, key, self._places.get(key) or self._stored.get(key))
+            if location is not None:
+                self.hits += 1
+                return location
+            self.misses += 1
+
+        location = self.provider.geocode(address)
+        if location is not None:
+            with self._lock:
+                self._remember(self._places, key, location)
+                self._stored[key] = location
+                snapshot = dict(self._stored)
+            # Written outside the lock so lookups never wait on the disk
+            try:
+                self._save_store(snapshot)
+            except OSError as e:
+                print(f"Could not save geocode store: {e}")
+        return location
+
+    def autocomplete(self, query):
+        """Suggestion strings for ``query``."""
+        key = normalize(query)
+        with self._lock:
+            suggestions = self._suggestions.get(key)
+            if suggestions is None:
+                suggestions = self._from_prefix(key)
+                if suggestions is not None:
+                    self.prefix_hits += 1
+            if suggestions is not None:
+                self.hits += 1
+                return list(self._remember(self._suggestions, key, suggestions))
+            self.misses += 1
+
+        suggestions = self.provider.autocomplete(query)
+        with self._lock:
+            self._remember(self._suggestions, key, suggestions)
+        return list(suggestions)
+
+    def _from_prefix(self, key):
+        """Predictions of the longest cached prefix of ``key`` that still match it, if reusable."""
+        for end in range(len(key) - 1, 0, -1):
+            cached = self._suggestions.get(key[:end])
+            if cached is None:
+                continue
+            remaining = [s for s in cached if matches(s, key)]
+            # A short list was everything the provider had for the prefix; a full one is
+            # only reusable while every prediction still matches
+            if len(cached) < AUTOCOMPLETE_PAGE_SIZE or len(remaining) == len(cached):
+                return remaining
+            return None
+        return None
+
+    def _remember(self, lru, key, value):
+        if value is not None:
+            lru[key] = value
+            lru.move_to_end(key)
+            while len(lru) > self.memory_size:
+                lru.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"stored": len(self._stored), "hits": self.hits, "misses": self.misses,
+                    "prefix_hits": self.prefix_hits}
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+from .geo import haversine
+
+
+class Circle:
+    """Download area of a point-radius graph."""
+
+    def __init__(self, center, radius):
+        self.center = center
+        self.radius = radius
+
+    def covers(self, other):
+        if not isinstance(other, Circle):
+            return False
+        distance = haversine(self.center[0], self.center[1], other.center[0], other.center[1])
+        return distance + other.radius <= self.radius
+
+
+class TileSet:
+    """Area of a graph stitched together from tiles."""
+
+    def __init__(self, keys):
+        self.keys = frozenset(keys)
+
+    def covers(self, other):
+        return isinstance(other, TileSet) and self.keys >= other.keys
+
+
+class GraphCacheEntry:
+    def __init__(self, graph, region):
+        self.graph = graph
+        self.region = region
+        self.nbytes = graph.nbytes
+
+
+class GraphCache:
+    """Bounded LRU of loaded graphs, keyed like the on-disk cache files.
+
+    Eviction is driven by the summed ``nbytes`` of the cached graphs rather than
+    by entry count, so one metro-sized graph can push out many small ones.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.containment_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, region):
+        """Exact key match first, then any cached graph whose region covers the request."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.graph
+
+            for other_key, entry in self._entries.items():
+                if entry.region.covers(region):
+                    self._entries.move_to_end(other_key)
+                    self.hits += 1
+                    self.containment_hits += 1
+                    return entry.graph
+
+            self.misses += 1
+            return None
+
+    def put(self, key, graph, region):
+        entry = GraphCacheEntry(graph, region)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key).nbytes
+
+            # A graph larger than the whole budget is still returned to the caller, just not kept
+            if entry.nbytes > self.budget_bytes:
+                return
+
+            self._entries[key] = entry
+            self.total_bytes += entry.nbytes
+            while self.total_bytes > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "containment_hits": self.containment_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,160 @@
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+from . import speed_profiles
+from .compiled_graph import CompiledGraph
+from .spatial_index import GridIndex
+
+# File layout: MAGIC | version (u32) | header length (u32) | JSON header | padded raw arrays.
+# Every array starts on an ALIGNMENT boundary so it can be viewed straight out of the mmap.
+MAGIC = b"RGRAPH\x00\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+GRAPH_EXTENSION = ".rgraph"
+
+GRAPH_ARRAYS = ("node_ids", "lat", "lon", "indptr", "indices", "travel_time")
+# Added after version 1 shipped, as ``name: (array to save, constructor argument from the
+# saved array)``. Files without them still load: road classes read as "other" and
+# time-dependent searches fall back to the current speed profile. The grid index arrays are
+# optional too; a file without them rebuilds the index on first snap.
+OPTIONAL_GRAPH_ARRAYS = {
+    "road_class": (lambda graph: graph.road_class, lambda array: array),
+    "speed_profile": (lambda graph: _profile(graph).quantized, speed_profiles.SpeedProfile),
+}
+
+_PREAMBLE = struct.Struct("<8sII")
+
+
+class GraphFormatError(Exception):
+    """Raised when a binary cache file is truncated, foreign or from another format version."""
+
+
+class GraphNotCachedError(Exception):
+    """Raised when a graph or tile is missing from the cache and ``config.ALLOW_DOWNLOADS`` is off."""
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_arrays(path, arrays, meta=None):
+    """Write a dict of 1-D/2-D arrays plus a JSON-able ``meta`` dict to ``path``."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+
+    # The header size depends on the offsets it contains, so lay it out until it settles
+    entries = {}
+    header = b""
+    while True:
+        first_offset = offset = _align(_PREAMBLE.size + len(header))
+        for name, a in arrays.items():
+            entries[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+            offset = _align(offset + a.nbytes)
+        laid_out = json.dumps({"arrays": entries, "meta": meta or {}}).encode("utf-8")
+        settled = _PREAMBLE.size + len(laid_out) <= first_offset
+        header = laid_out
+        if settled:
+            break
+
+    # Written beside the target and renamed over it, so readers (and a crash mid-write)
+    # never see a partial file
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            for name, a in arrays.items():
+                f.write(b"\x00" * (entries[name]["offset"] - f.tell()))
+                f.write(a.tobytes())
+            # Pad to the laid-out end so trailing empty arrays still map inside the file
+            f.write(b"\x00" * (offset - f.tell()))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def temp_path(path):
+    """Scratch name next to ``path``, unique per process and thread."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def read_header(path):
+    """The JSON header of a file written by ``save_arrays``, without mapping its arrays."""
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise GraphFormatError(f"{path}: truncated header")
+        magic, version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise GraphFormatError(f"{path}: not a graph cache file")
+        if version != FORMAT_VERSION:
+            raise GraphFormatError(f"{path}: format version {version}, expected {FORMAT_VERSION}")
+        try:
+            return json.loads(f.read(header_len).decode("utf-8"))
+        except ValueError as e:
+            raise GraphFormatError(f"{path}: corrupt header ({e})")
+
+
+def load_arrays(path):
+    """Memory-map a file written by ``save_arrays``; returns ``(arrays, meta)``.
+
+    The arrays are read-only views into one shared mapping, so a warm load only
+    touches the pages a query actually reads.
+    """
+    header = read_header(path)
+
+    # Plain ndarrays over the mapping: np.memmap slices carry a noticeable
+    # per-slice overhead in the search loops
+    mapping = np.frombuffer(np.memmap(path, dtype=np.uint8, mode="r"), dtype=np.uint8)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        end = entry["offset"] + nbytes
+        if end > len(mapping):
+            raise GraphFormatError(f"{path}: array '{name}' runs past end of file")
+        arrays[name] = mapping[entry["offset"]:end].view(dtype).reshape(shape)
+    return arrays, header["meta"]
+
+
+def save_graph(graph, path, meta=None):
+    arrays = {name: getattr(graph, name) for name in GRAPH_ARRAYS}
+    arrays.update({name: to_array(graph) for name, (to_array, _) in OPTIONAL_GRAPH_ARRAYS.items()})
+    # Persist the snapping index so warm loads never rebuild it
+    arrays.update(graph.spatial_index().to_arrays())
+    save_arrays(path, arrays, meta)
+    graph.source = os.path.abspath(path)
+
+
+def load_graph(path):
+    """Load a CompiledGraph saved with ``save_graph``; returns ``(graph, meta)``."""
+    arrays, meta = load_arrays(path)
+    missing = [name for name in GRAPH_ARRAYS if name not in arrays]
+    if missing:
+        raise GraphFormatError(f"{path}: missing arrays {missing}")
+    optional = {
+        name: from_array(arrays[name])
+        for name, (_, from_array) in OPTIONAL_GRAPH_ARRAYS.items() if name in arrays
+    }
+    graph = CompiledGraph(*(arrays[name] for name in GRAPH_ARRAYS), **optional)
+    graph._spatial_index = GridIndex.from_arrays(arrays)
+    graph.source = os.path.abspath(path)
+    return graph, meta
+
+
+def _profile(graph):
+    # Freshly compiled graphs take the current time-of-day profile with them
+    return graph.speed_profile if graph.speed_profile is not None else speed_profiles.current()
+
+
+def load_source(source):
+    """Rebuild a graph from its ``source``: one cache file, or the tiles it was stitched from."""
+    if isinstance(source, str):
+        return load_graph(source)[0]
+    return CompiledGraph.merge([load_graph(path)[0] for path in source])
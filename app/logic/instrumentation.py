@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+_local = threading.local()
+
+# Taken when this module is first imported; main.py imports it before anything heavy
+_PROCESS_STARTED = time.perf_counter()
+
+
+class RouteStats:
+    """Timers and counters collected while routing one request.
+
+    Phase times are summed across threads, so with parallel graph fetching
+    they can add up to more than the wall-clock ``total``. Safe to update
+    from several threads at once. Time-dependent routes also leave each leg's
+    ``(depart_at, arrive_at)`` in ``schedule``.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self.searches = []
+        self.schedule = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_search(self, search_stats):
+        """Stats of one leg's search, as recorded in ``RoutingEngine.last_search_stats``."""
+        with self._lock:
+            self.searches.append(dict(search_stats))
+            for key in ("nodes_popped", "stale_skipped", "relaxations", "nodes_expanded"):
+                if key in search_stats:
+                    self.counters[key] = self.counters.get(key, 0) + search_stats[key]
+            if "peak_heap" in search_stats:
+                self.counters["peak_heap"] = max(self.counters.get("peak_heap", 0), search_stats["peak_heap"])
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "timings_ms": {name: round(seconds * 1e3, 3) for name, seconds in self.timings.items()},
+                "counters": dict(self.counters),
+                "searches": [dict(s) for s in self.searches],
+            }
+
+    def summary_lines(self):
+        """Short human-readable lines for the sidebar stats panel."""
+        with self._lock:
+            timings = sorted(self.timings.items(), key=lambda item: -item[1])
+            counters = dict(self.counters)
+        lines = [f"{name}: {seconds * 1e3:.0f} ms" for name, seconds in timings]
+        for key in ("nodes_popped", "relaxations", "stale_skipped", "peak_heap"):
+            if key in counters:
+                lines.append(f"{key}: {counters[key]}")
+        return lines
+
+    def log(self, event="route"):
+        """One JSON line per routing request, when ``config.LOG_ROUTE_STATS`` is on."""
+        if config.LOG_ROUTE_STATS:
+            record = {"event": event}
+            record.update(self.as_dict())
+            record.pop("searches")
+            print(json.dumps(record, sort_keys=True))
+
+
+class _NoStats:
+    """Stand-in when nothing is being recorded; every call is a no-op."""
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def add_search(self, search_stats):
+        pass
+
+
+_NO_STATS = _NoStats()
+
+
+class StartupTimer:
+    """Milestones since launch (first paint, engine ready, first route...), each recorded once.
+
+    Printed as JSON lines when enabled, so cold-start regressions show up
+    without a profiler. The clock starts when this module is first imported.
+    """
+
+    def __init__(self):
+        self.marks = {}
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = time.perf_counter() - _PROCESS_STARTED
+            seconds = self.marks[name]
+        if self.enabled:
+            print(json.dumps({"event": "startup", "mark": name, "ms": round(seconds * 1e3, 1)}))
+
+
+startup = StartupTimer()
+
+
+def current():
+    """The RouteStats being recorded on this thread, or a no-op stand-in."""
+    return getattr(_local, "stats", None) or _NO_STATS
+
+
+@contextmanager
+def recording(stats):
+    """Send every ``phase`` / ``count`` on this thread to ``stats`` for the duration."""
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def bind(stats, fn):
+    """Wrap ``fn`` so it records into ``stats`` on whichever pool thread runs it."""
+    def run(*args, **kwargs):
+        with recording(stats):
+            return fn(*args, **kwargs)
+    return run
+
+
+def phase(name):
+    return current().phase(name)
+
+
+def count(name, amount=1):
+    current().count(name, amount)
@@ -0,0 +1,160 @@
+import random
+
+import numpy as np
+
+from .graph_store import load_arrays, save_arrays
+from .search import dijkstra
+
+ALT_EXTENSION = ".alt"
+
+
+class LandmarkTable:
+    """Precomputed travel times to and from a few landmark nodes (ALT).
+
+    ``forward[k, v]`` is the base travel time from landmark ``k`` to node ``v``
+    and ``backward[k, v]`` the time from ``v`` to landmark ``k``. Both are kept
+    as float32 to halve their size; unreachable entries are ``inf``.
+    """
+
+    def __init__(self, fingerprint, landmarks, forward, backward):
+        self.fingerprint = fingerprint
+        self.landmarks = landmarks
+        self.forward = forward
+        self.backward = backward
+
+    def is_valid_for(self, graph):
+        return graph.weight_scale is not None and graph.fingerprint() == self.fingerprint
+
+    @classmethod
+    def build(cls, graph, count=16, strategy="avoid", seed=0):
+        base = graph.scaled(1.0)
+        reverse = base.reverse()
+        rng = random.Random(seed)
+        count = min(count, graph.num_nodes)
+
+        landmarks, forward, backward = [], [], []
+
+        def add(landmark):
+            landmarks.append(landmark)
+            forward.append(dijkstra(base, landmark)[0])
+            backward.append(dijkstra(reverse, landmark)[0])
+
+        # Both strategies start from the node farthest from a random one
+        dist, _ = dijkstra(base, rng.randrange(graph.num_nodes))
+        add(_argmax_finite(dist))
+
+        while len(landmarks) < count:
+            candidate = None
+            if strategy == "avoid":
+                candidate = _select_avoid(base, forward, backward, landmarks, rng)
+            if candidate is None:
+                candidate = _select_farthest(forward, backward, landmarks)
+            if candidate is None:
+                break
+            add(candidate)
+
+        return cls(
+            graph.fingerprint(),
+            np.asarray(landmarks, dtype=np.int32),
+            np.vstack(forward).astype(np.float32),
+            np.vstack(backward).astype(np.float32),
+        )
+
+    def save(self, path):
+        save_arrays(
+            path,
+            {"landmarks": self.landmarks, "forward": self.forward, "backward": self.backward},
+            meta={"fingerprint": self.fingerprint},
+        )
+
+    @classmethod
+    def load(cls, path):
+        arrays, meta = load_arrays(path)
+        return cls(meta["fingerprint"], arrays["landmarks"], arrays["forward"], arrays["backward"])
+
+    def heuristic_array(self, target, scale=1.0):
+        """Lower bound on the travel time from every node to ``target``, in seconds.
+
+        Triangle inequality per landmark L:
+        d(v, t) >= d(L, t) - d(L, v)  and  d(v, t) >= d(v, L) - d(t, L).
+        """
+        with np.errstate(invalid="ignore"):
+            via_forward = self.forward[:, target][:, None] - self.forward
+            via_backward = self.backward - self.backward[:, target][:, None]
+            bound = np.fmax(via_forward, via_backward).max(axis=0)
+        # inf - inf (landmark unreachable both ways) is NaN: no information, bound 0
+        bound = np.nan_to_num(bound, nan=0.0, posinf=np.inf, neginf=0.0)
+        return np.maximum(bound, 0.0).astype(np.float64) * scale
+
+
+    def source_heuristic_array(self, source, scale=1.0):
+        """Lower bound on the travel time from ``source`` to every node, in seconds."""
+        with np.errstate(invalid="ignore"):
+            via_forward = self.forward - self.forward[:, source][:, None]
+            via_backward = self.backward[:, source][:, None] - self.backward
+            bound = np.fmax(via_forward, via_backward).max(axis=0)
+        bound = np.nan_to_num(bound, nan=0.0, posinf=np.inf, neginf=0.0)
+        return np.maximum(bound, 0.0).astype(np.float64) * scale
+
+
+def _argmax_finite(dist):
+    finite = np.where(np.isfinite(dist), dist, -1.0)
+    return int(np.argmax(finite))
+
+
+def _select_farthest(forward, backward, landmarks):
+    """Node whose round trip to its nearest landmark is longest."""
+    round_trip = np.min(np.vstack(forward) + np.vstack(backward), axis=0)
+    round_trip[~np.isfinite(round_trip)] = -1.0
+    round_trip[landmarks] = -1.0
+    candidate = int(np.argmax(round_trip))
+    return candidate if round_trip[candidate] > 0 else None
+
+
+def _select_avoid(graph, forward, backward, landmarks, rng):
+    """Goldberg & Harrelson's "avoid": grow a shortest-path tree from a random root,
+    find the landmark-free subtree whose distances the current landmarks bound
+    worst, and take a leaf of it."""
+    root = rng.randrange(graph.num_nodes)
+    dist, parent = dijkstra(graph, root)
+    reached = np.isfinite(dist)
+
+    fwd = np.vstack(forward)
+    bwd = np.vstack(backward)
+    with np.errstate(invalid="ignore"):
+        lower = np.fmax(fwd - fwd[:, root][:, None], bwd[:, root][:, None] - bwd).max(axis=0)
+    lower = np.nan_to_num(lower, nan=0.0, posinf=0.0, neginf=0.0)
+    weight = np.where(reached, dist - np.maximum(lower, 0.0), 0.0)
+
+    # Subtree sums, children before parents (children are always farther from the root)
+    order = np.argsort(-np.where(reached, dist, -1.0))
+    parent_list = parent.tolist()
+    size_list = weight.tolist()
+    for v in order.tolist():
+        p = parent_list[v]
+        if p >= 0:
+            size_list[p] += size_list[v]
+
+    # Subtrees that already contain a landmark are covered well enough
+    covered = [False] * graph.num_nodes
+    for landmark in landmarks:
+        v = landmark
+        while v >= 0 and not covered[v]:
+            covered[v] = True
+            size_list[v] = 0.0
+            v = parent_list[v]
+
+    children = [[] for _ in range(graph.num_nodes)]
+    for v, p in enumerate(parent_list):
+        if p >= 0:
+            children[p].append(v)
+
+    node = max(range(graph.num_nodes), key=size_list.__getitem__)
+    if size_list[node] <= 0.0:
+        return None
+    while children[node]:
+        best = max(children[node], key=size_list.__getitem__)
+        if size_list[best] <= 0.0:
+            break
+        node = best
+    return None if node in landmarks else node
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LegCache:
+    """Searched leg paths, reused when the same leg is routed again.
+
+    Keys combine the graph fingerprint, the snapped origin and destination
+    nodes, the search mode and the traffic factor the search ran under, so a
+    changed graph or new traffic data simply misses. Each entry also expires
+    with the traffic snapshot it was searched against. Reordering, deleting or
+    adding a stop therefore only searches the legs whose stop pair is new.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(graph, orig_node, dest_node, mode):
+        """Cache key for one leg, or None when the graph's traffic layer isn't a single factor."""
+        factor = graph.weight_scale
+        if factor is None:
+            return None
+        return graph.fingerprint(), orig_node, dest_node, mode, round(factor, 6)
+
+    def get(self, key):
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, path, expires_at):
+        if key is None or not path:
+            return
+        with self._lock:
+            self._entries[key] = (path, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "expired": self.expired}
@@ -0,0 +1,359 @@
+import bz2
+import gzip
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+
+from . import cancellation
+from .compiled_graph import CompiledGraph, road_class_code
+from .geo import haversine, haversine_array
+from .graph_store import GRAPH_EXTENSION, save_graph
+
+# The way filter osmnx uses for network_type="drive"; like Overpass, each pattern is an unanchored regex
+DRIVE_EXCLUDED = {
+    "area": re.compile("yes"),
+    "access": re.compile("private"),
+    "highway": re.compile(
+        "abandoned|bridleway|bus_guideway|construction|corridor|cycleway|elevator|escalator|"
+        "footway|no|path|pedestrian|planned|platform|proposed|raceway|razed|rest_area|service|"
+        "services|steps|track"
+    ),
+    "motor_vehicle": re.compile("no"),
+    "motorcar": re.compile("no"),
+    "service": re.compile("alley|driveway|emergency_access|parking|parking_aisle|private"),
+}
+
+ONEWAY_FORWARD = {"yes", "true", "1", "F"}
+ONEWAY_REVERSE = {"-1", "reverse", "T"}
+
+# Used only when the extract carries no maxspeed at all to impute from
+FALLBACK_SPEED_KPH = 50.0
+
+MAXSPEED_RE = re.compile(r"^([0-9][\.,0-9]*?)(?:[ ]?(?:km/h|kmh|kph|mph|knots))?$")
+MILES_TO_KM = 1.60934
+
+# Nodes are filtered against the drivable ways' node ids this many at a time
+NODE_CHUNK = 1 << 20
+
+
+def is_drivable(tags):
+    """Whether a way with these tags is part of osmnx's "drive" network."""
+    if "highway" not in tags:
+        return False
+    return not any(key in tags and pattern.search(tags[key]) for key, pattern in DRIVE_EXCLUDED.items())
+
+
+def oneway_direction(tags):
+    """1 for travel in node order only, -1 against it only, 0 for both directions."""
+    oneway = tags.get("oneway")
+    if oneway in ONEWAY_REVERSE:
+        return -1
+    if oneway in ONEWAY_FORWARD or tags.get("junction") == "roundabout":
+        return 1
+    return 0
+
+
+def parse_maxspeed(value):
+    """km/h from an OSM ``maxspeed`` value (per-lane values averaged, mph converted), or None."""
+    if not value:
+        return None
+    speeds = []
+    for part in value.split("|"):
+        match = MAXSPEED_RE.match(part.strip())
+        if match is None:
+            return None
+        try:
+            speeds.append(float(match.group(1).replace(",", ".")))
+        except ValueError:
+            return None
+    speed = sum(speeds) / len(speeds)
+    return speed * MILES_TO_KM if "mph" in value.lower() else speed
+
+
+class OsmImporter:
+    """Builds routing tiles from a local ``.osm`` / ``.osm.pbf`` extract.
+
+    The extract is streamed twice and never held in memory: the first pass
+    keeps only the node ids and tags of drivable ways, the second only the
+    coordinates of the nodes those ways use. Speeds are imputed the way
+    ``ox.add_edge_speeds`` does (mean ``maxspeed`` per highway type, then the
+    overall mean), and every tile touching ``bbox`` is written to the
+    ``TileStore`` in the same form as a downloaded one, so legs inside the
+    region route without a download. Tiles only partly inside are marked
+    ``partial`` and replaced by a download whenever downloads are allowed.
+    ``bbox`` is ``(south, west, north, east)`` and defaults to the extract's
+    declared bounds, or else to its node extent.
+    """
+
+    def __init__(self, path, tile_store, bbox=None):
+        self.path = path
+        self.tile_store = tile_store
+        self.bbox = bbox
+
+        # Drivable ways: flattened node refs plus per-way offsets and attributes
+        self._refs = array("q")
+        self._offsets = array("q", [0])
+        self._highways = array("i")
+        self._highway_codes = {}
+        self._maxspeeds = array("d")
+        self._oneway = array("b")
+
+        self._node_ids = []
+        self._node_lat = []
+        self._node_lon = []
+        self._bounds = None
+        self._extent = [math.inf, math.inf, -math.inf, -math.inf]
+
+    def run(self, region_graph=False):
+        """Import the extract; returns ``(tiles written, region graph path or None)``."""
+        reader = _PbfReader(self.path) if self.path.endswith(".pbf") else _XmlReader(self.path)
+
+        print(f"Reading drivable ways from {os.path.basename(self.path)}")
+        self._bounds = reader.read(on_way=self._add_way)
+        print(f"{len(self._oneway)} drivable ways; reading their nodes")
+        needed = np.unique(np.frombuffer(self._refs, dtype=np.int64))
+        pending = ([], [], [])
+
+        def on_node(node_id, lat, lon):
+            pending[0].append(node_id)
+            pending[1].append(lat)
+            pending[2].append(lon)
+            if len(pending[0]) >= NODE_CHUNK:
+                self._keep_nodes(needed, pending)
+
+        reader.read(on_node=on_node)
+        self._keep_nodes(needed, pending)
+
+        graph = self._build_graph()
+        bbox = self.bbox or self._bounds or tuple(self._extent)
+        written = self._write_tiles(graph, bbox)
+        print(f"Wrote {written} tile(s) covering {bbox}")
+        if region_graph:
+            return written, self._write_region_graph(graph, bbox)
+        return written, None
+
+    def _add_way(self, refs, tags):
+        if len(refs) < 2 or not is_drivable(tags):
+            return
+        self._refs.extend(refs)
+        self._offsets.append(len(self._refs))
+        highway = tags["highway"]
+        self._highways.append(self._highway_codes.setdefault(highway, len(self._highway_codes)))
+        speed = parse_maxspeed(tags.get("maxspeed"))
+        self._maxspeeds.append(math.nan if speed is None else speed)
+        self._oneway.append(oneway_direction(tags))
+
+    def _keep_nodes(self, needed, pending):
+        cancellation.check()
+        ids = np.asarray(pending[0], dtype=np.int64)
+        if len(ids):
+            lat = np.asarray(pending[1])
+            lon = np.asarray(pending[2])
+            self._extent = [min(self._extent[0], lat.min()), min(self._extent[1], lon.min()),
+                            max(self._extent[2], lat.max()), max(self._extent[3], lon.max())]
+            keep = np.isin(ids, needed)
+            self._node_ids.append(ids[keep])
+            self._node_lat.append(lat[keep])
+            self._node_lon.append(lon[keep])
+        for values in pending:
+            values.clear()
+
+    def _impute_speeds(self, maxspeeds, highways):
+        """km/h per edge: its own maxspeed, else the mean over edges of its highway type, else the overall mean."""
+        known = ~np.isnan(maxspeeds)
+        overall = float(maxspeeds[known].mean()) if known.any() else FALLBACK_SPEED_KPH
+        speeds = maxspeeds.copy()
+        for code in np.unique(highways):
+            of_type = highways == code
+            observed = maxspeeds[of_type & known]
+            speeds[of_type & ~known] = observed.mean() if len(observed) else overall
+        return speeds
+
+    def _build_graph(self):
+        """One CompiledGraph of every drivable way segment whose two nodes are in the extract."""
+        node_ids = np.concatenate(self._node_ids) if self._node_ids else np.empty(0, dtype=np.int64)
+        order = np.argsort(node_ids)
+        node_ids = node_ids[order]
+        lat = np.concatenate(self._node_lat)[order] if self._node_lat else np.empty(0)
+        lon = np.concatenate(self._node_lon)[order] if self._node_lon else np.empty(0)
+        if len(node_ids) == 0:
+            return CompiledGraph.empty()
+
+        refs = np.frombuffer(self._refs, dtype=np.int64)
+        offsets = np.frombuffer(self._offsets, dtype=np.int64)
+        way_of_ref = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+        # Consecutive refs of the same way are one segment; drop those leaving the extract
+        same_way = way_of_ref[:-1] == way_of_ref[1:]
+        positions = np.searchsorted(node_ids, refs).clip(0, len(node_ids) - 1)
+        present = node_ids[positions] == refs
+        segment = same_way & present[:-1] & present[1:]
+        src, dst = positions[:-1][segment], positions[1:][segment]
+        ways = way_of_ref[:-1][segment]
+
+        # One directed edge per allowed direction, as osmnx adds them
+        oneway = np.frombuffer(self._oneway, dtype=np.int8)[ways]
+        forward, backward = oneway >= 0, oneway <= 0
+        src, dst = np.concatenate([src[forward], dst[backward]]), np.concatenate([dst[forward], src[backward]])
+        ways = np.concatenate([ways[forward], ways[backward]])
+
+        highways = np.frombuffer(self._highways, dtype=np.int32)[ways]
+        speeds = self._impute_speeds(np.frombuffer(self._maxspeeds, dtype=np.float64)[ways], highways)
+        length = haversine_array(lat[src], lon[src], lat[dst], lon[dst])
+        class_of = np.zeros(len(self._highway_codes), dtype=np.uint8)
+        for highway, code in self._highway_codes.items():
+            class_of[code] = road_class_code(highway)
+        return CompiledGraph.from_edges(
+            node_ids, lat, lon, src, dst, length / (speeds / 3.6), class_of[highways],
+        )
+
+    def _write_tiles(self, graph, bbox):
+        """Save every tile touching ``bbox``; an edge belongs to the tiles of both its ends."""
+        store = self.tile_store
+        south, west, north, east = bbox
+        low_row, low_col = store.tile_key(south, west)
+        high_row, high_col = store.tile_key(north, east)
+        keys = [(row, col) for row in range(low_row, high_row + 1) for col in range(low_col, high_col + 1)]
+
+        # Tile of every node as one int, then edges grouped by the tile of each of their ends
+        width = high_col - low_col + 1
+        rows = np.floor(graph.lat / store.tile_size).astype(np.int64) - low_row
+        cols = np.floor(graph.lon / store.tile_size).astype(np.int64) - low_col
+        node_tile = np.where((rows >= 0) & (cols >= 0) & (cols < width), rows * width + cols, -1)
+
+        src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+        dst = graph.indices.astype(np.int64)
+        edge_ids = np.arange(len(dst))
+        crossing = node_tile[src] != node_tile[dst]
+        edge_tile = np.concatenate([node_tile[src], node_tile[dst][crossing]])
+        edge_ids = np.concatenate([edge_ids, edge_ids[crossing]])
+        order = np.argsort(edge_tile, kind="stable")
+        edge_tile, edge_ids = edge_tile[order], edge_ids[order]
+
+        os.makedirs(store.cache_dir, exist_ok=True)
+        written = []
+        for key in keys:
+            cancellation.check()
+            code = (key[0] - low_row) * width + (key[1] - low_col)
+            start, end = np.searchsorted(edge_tile, [code, code + 1])
+            edges = edge_ids[start:end]
+            tile = _subgraph(graph, src[edges], dst[edges], edges)
+            path = store.tile_path(key)
+            with store.disk_cache.lock(path):
+                save_graph(tile, path, meta={"tile": list(key), "tile_size": store.tile_size,
+                                             "source": os.path.basename(self.path),
+                                             "partial": not _inside(store.tile_bounds(key), bbox)})
+            written.append((path, store.tile_bounds(key)))
+        # Pinned: offline hosts can never download these again, so eviction must leave them alone
+        store.disk_cache.record_many("tile", written, pinned=True)
+        return len(keys)
+
+    def _write_region_graph(self, graph, bbox):
+        """Save the whole region as a point-radius graph on the largest circle inside ``bbox``."""
+        south, west, north, east = bbox
+        center = ((south + north) / 2, (west + east) / 2)
+        radius = min(haversine(south, center[1], north, center[1]),
+                     haversine(center[0], west, center[0], east)) / 2
+        basename = f"graph_{center[0]:.3f}_{center[1]:.3f}_{int(radius / 100) * 100}"
+        disk_cache = self.tile_store.disk_cache
+        path = os.path.join(disk_cache.cache_dir, basename + GRAPH_EXTENSION)
+        with disk_cache.lock(path):
+            save_graph(graph, path, meta={"center": list(center), "radius": radius,
+                                          "source": os.path.basename(self.path)})
+            disk_cache.record(path, "graph", center=center, radius=radius, pinned=True)
+        print(f"Wrote region graph {basename}{GRAPH_EXTENSION}")
+        return path
+
+
+def _inside(inner, outer):
+    return inner[0] >= outer[0] and inner[1] >= outer[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def _subgraph(graph, src, dst, edges):
+    """The given edges of ``graph`` with just the nodes they touch, renumbered."""
+    if len(edges) == 0:
+        return CompiledGraph.empty()
+    nodes, local = np.unique(np.concatenate([src, dst]), return_inverse=True)
+    return CompiledGraph.from_edges(
+        graph.node_ids[nodes], graph.lat[nodes], graph.lon[nodes],
+        local[:len(src)], local[len(src):],
+        graph.travel_time[edges], graph.road_class[edges],
+    )
+
+
+class _XmlReader:
+    """Streams ``.osm`` XML (optionally ``.gz`` / ``.bz2``) with iterparse, clearing elements as it goes."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _open(self):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, "rb")
+        if self.path.endswith(".bz2"):
+            return bz2.open(self.path, "rb")
+        return open(self.path, "rb")
+
+    def read(self, on_way=None, on_node=None):
+        """Call ``on_way(refs, tags)`` / ``on_node(id, lat, lon)``; returns the declared bounds, if any."""
+        bounds = None
+        with self._open() as f:
+            context = ET.iterparse(f, events=("start", "end"))
+            _, root = next(context)
+            for event, elem in context:
+                if event != "end":
+                    continue
+                if elem.tag == "node":
+                    if on_node is not None:
+                        on_node(int(elem.get("id")), float(elem.get("lat")), float(elem.get("lon")))
+                elif elem.tag == "way":
+                    if on_way is not None:
+                        refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                        tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                        on_way(refs, tags)
+                elif elem.tag == "bounds":
+                    bounds = tuple(float(elem.get(k)) for k in ("minlat", "minlon", "maxlat", "maxlon"))
+                elif elem.tag != "relation":
+                    continue
+                # Drop finished top-level elements so memory stays flat
+                root.clear()
+        return bounds
+
+
+class _PbfReader:
+    """Streams ``.osm.pbf`` through pyosmium, which is only needed for this format."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            import osmium
+        except ImportError:
+            raise RuntimeError("Reading .pbf extracts needs pyosmium (pip install osmium); "
+                               "convert the extract to .osm XML otherwise")
+        self.osmium = osmium
+
+    def read(self, on_way=None, on_node=None):
+        osmium = self.osmium
+
+        class Handler(osmium.SimpleHandler):
+            def way(self, way):
+                if on_way is not None:
+                    on_way([node.ref for node in way.nodes], {tag.k: tag.v for tag in way.tags})
+
+            def node(self, node):
+                if on_node is not None and node.location.valid():
+                    on_node(node.id, node.location.lat, node.location.lon)
+
+        Handler().apply_file(self.path, locations=False)
+        reader = osmium.io.Reader(self.path, osmium.osm.osm_entity_bits.NOTHING)
+        try:
+            box = reader.header().box()
+        finally:
+            reader.close()
+        if not box.valid():
+            return None
+        return box.bottom_left.lat, box.bottom_left.lon, box.top_right.lat, box.top_right.lon
@@ -0,0 +1,269 @@
+import itertools
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import config
+
+from . import cancellation, instrumentation
+from .cancellation import CancellationToken
+from .graph_store import GraphFormatError, load_source
+from .instrumentation import RouteStats
+
+# How often a thread blocked on a pool future looks at its cancellation token
+CANCEL_POLL_SECONDS = 0.1
+
+# Graphs each search worker keeps mapped from cache/ between legs
+WORKER_GRAPHS = 4
+
+# One search-only engine per search worker process, created on its first leg
+_worker_engine = None
+_worker_graphs = OrderedDict()
+
+
+def graph_reference(graph):
+    """What a worker needs to search ``graph``: its cache file(s), fingerprint and traffic layer.
+
+    Graphs never saved to ``cache/`` are sent whole.
+    """
+    if graph.source is None:
+        return graph
+    return graph.source, graph.fingerprint(), graph.traffic
+
+
+def search_leg(graph_ref, orig_node, dest_node, mode=None):
+    """Process-pool entry point: route one leg on a graph from ``graph_reference``.
+
+    The worker maps the graph's cache files itself (and keeps the last few), so
+    only a path and a traffic layer cross the process boundary. Returns
+    ``(path, search_stats)`` so the caller can record the search.
+    """
+    global _worker_engine
+    if _worker_engine is None:
+        from .routing import RoutingEngine
+        _worker_engine = RoutingEngine(search_only=True)
+    graph = _worker_graph(graph_ref)
+    path = _worker_engine.find_path(graph, orig_node, dest_node, mode)
+    return path, _worker_engine.last_search_stats
+
+
+def _worker_graph(graph_ref):
+    if not isinstance(graph_ref, tuple):
+        return graph_ref
+    source, fingerprint, traffic = graph_ref
+    key = (source, fingerprint)
+    graph = _worker_graphs.get(key)
+    if graph is None:
+        graph = load_source(source)
+        if graph.fingerprint() != fingerprint:
+            raise GraphFormatError(f"{source} changed on disk after the route loaded it")
+        _worker_graphs[key] = graph
+        if len(_worker_graphs) > WORKER_GRAPHS:
+            _worker_graphs.popitem(last=False)
+    else:
+        _worker_graphs.move_to_end(key)
+    return graph.with_traffic(traffic)
+
+
+class RoutePipeline:
+    """Routes every leg of a trip, overlapping graph fetching with searching.
+
+    Graphs for all legs are fetched on a small thread pool (downloads and disk
+    are I/O bound) alongside one batched traffic lookup, and each leg's search
+    is handed to a process pool as soon as its graph is ready, so independent
+    legs search in parallel. Workers get the graph's cache file path rather
+    than a copy of the graph, and read preprocessed ALT / CH data that was
+    prepared once on the calling thread. Legs on graphs smaller than
+    ``config.INLINE_SEARCH_MAX_NODES``, where handing off costs more than the
+    search, and every leg when ``workers <= 1``, search inline on the calling
+    thread. Legs found in the engine's LegCache (same graph, snapped nodes,
+    mode and traffic) skip the search entirely.
+
+    A cancelled job stops at the next tile, traffic batch or every
+    ``cancellation.CHECK_INTERVAL`` search pops. Searches already running in
+    worker processes finish, but their results are dropped.
+
+    In ``"time_dependent"`` mode each leg leaves when the previous one
+    arrives, so legs are searched in order on the calling thread (graphs are
+    still fetched ahead) against the graphs' speed profiles, with no traffic
+    lookup. The per-leg ``(depart_at, arrive_at)`` times end up in the route's ``stats.schedule``.
+    """
+
+    def __init__(self, engine, workers=None, fetch_workers=None):
+        self.engine = engine
+        self.workers = config.ROUTING_WORKERS if workers is None else workers
+        self.fetch_workers = config.GRAPH_FETCH_WORKERS if fetch_workers is None else fetch_workers
+        self._search_pool = None
+        self.last_stats = None
+
+    def _get_search_pool(self):
+        if self._search_pool is None and self.workers > 1:
+            # "spawn" so workers never inherit the UI thread's Tk state through fork()
+            self._search_pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._search_pool
+
+    def shutdown(self):
+        if self._search_pool is not None:
+            self._search_pool.shutdown(cancel_futures=True)
+            self._search_pool = None
+
+    def route(self, stops, mode=None, on_progress=None, stats=None, on_leg=None, cancel_token=None,
+              depart_at=None):
+        """Route ``[(lat, lon), ...]`` in order; returns ``(full_path, on_road_stops)``.
+
+        ``on_progress(done, total)`` is called each time a leg finishes and
+        ``on_leg(index, path)`` with the path of each leg found, both in
+        completion order and possibly from a pool thread. Per-phase timers and
+        search counters go into ``stats`` (a new RouteStats by default), which
+        is also kept as ``last_stats`` and logged when the route finishes.
+        Cancelling ``cancel_token`` makes this raise ``RouteCancelled``.
+        ``depart_at`` (epoch seconds, default now) is the departure time for
+        ``"time_dependent"`` mode.
+        """
+        stats = RouteStats() if stats is None else stats
+        token = CancellationToken() if cancel_token is None else cancel_token
+        self.last_stats = stats
+        started = time.perf_counter()
+        try:
+            with instrumentation.recording(stats), cancellation.checking(token):
+                return self._route(stops, mode, on_progress, on_leg, stats, token, depart_at)
+        finally:
+            stats.add_time("total", time.perf_counter() - started)
+            stats.log()
+
+    def _route(self, stops, mode, on_progress, on_leg, stats, token, depart_at):
+        # Resolved here so cached legs are keyed by the mode that actually searched them
+        mode = mode or config.SEARCH_MODE
+        legs = list(zip(stops[:-1], stops[1:]))
+        stats.count("legs", len(legs))
+        search_pool = self._get_search_pool()
+        leg_cache = self.engine.leg_cache
+        finished = itertools.count(1)
+
+        def leg_done(index, path):
+            if token.cancelled:
+                return
+            if on_leg and path:
+                on_leg(index, path)
+            if on_progress:
+                on_progress(next(finished), len(legs))
+
+        def search_done(index, future):
+            if not future.cancelled() and future.exception() is None:
+                leg_done(index, future.result()[0])
+
+        def bind(fn):
+            return instrumentation.bind(stats, cancellation.bind(token, fn))
+
+        if mode == "time_dependent":
+            return self._route_time_dependent(legs, depart_at, leg_done, bind, stats, token)
+
+        searches = []
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as fetch_pool:
+            # One batched traffic request for the whole route, overlapping the graph fetches
+            traffic_future = fetch_pool.submit(bind(self.engine.get_traffic_snapshot), legs)
+            fetch_graph = bind(self.engine.get_graph_for_segment)
+            graph_futures = [fetch_pool.submit(fetch_graph, start, end, 1.0) for start, end in legs]
+
+            try:
+                snapped = []
+                traffic = _result(traffic_future, token)
+                for i, ((start, end), graph_future) in enumerate(zip(legs, graph_futures)):
+                    traffic_factor, expires_at = traffic[i]
+                    graph = _result(graph_future, token).scaled(traffic_factor)
+                    orig_node, dest_node = self.engine.snap_to_nodes(graph, [start, end])
+                    snapped.append((self.engine.get_node_coords(graph, orig_node),
+                                    self.engine.get_node_coords(graph, dest_node)))
+
+                    key = leg_cache.key(graph, orig_node, dest_node, mode)
+                    cached = leg_cache.get(key)
+                    leg = (graph, orig_node, dest_node)
+                    if cached is not None:
+                        stats.count("leg_cache_hits")
+                        search = None
+                        leg_done(i, cached)
+                    elif search_pool is not None and graph.num_nodes >= config.INLINE_SEARCH_MAX_NODES:
+                        self.engine.prepare_search(graph, mode)
+                        search = search_pool.submit(search_leg, graph_reference(graph), orig_node, dest_node, mode)
+                        search.add_done_callback(lambda future, i=i: search_done(i, future))
+                    else:
+                        search = self.engine.find_path(graph, orig_node, dest_node, mode)
+                        leg_done(i, search)
+                    searches.append((key, expires_at, cached, search, leg))
+
+                full_route_path = []
+                for i, (key, expires_at, cached, search, leg) in enumerate(searches):
+                    if cached is not None:
+                        segment_path = cached
+                    elif isinstance(search, Future):
+                        try:
+                            # Worker processes can't see this thread's stats; fold theirs in here
+                            segment_path, search_stats = _result(search, token)
+                            stats.add_time("search", search_stats.get("seconds", 0.0))
+                            stats.add_search(search_stats)
+                        except (GraphFormatError, OSError) as e:
+                            # The cache file was evicted or replaced since this route loaded it
+                            print(f"Searching leg {i + 1} inline: {e}")
+                            segment_path = self.engine.find_path(*leg, mode)
+                            leg_done(i, segment_path)
+                    else:
+                        segment_path = search
+                    if cached is None:
+                        leg_cache.put(key, segment_path, expires_at)
+                    if not segment_path:
+                        raise Exception(f"Could not find path between Stop {i + 1} and Stop {i + 2}")
+                    full_route_path.extend(segment_path)
+            except BaseException:
+                # Drop everything not yet started; running fetches stop at their next check
+                for future in graph_futures:
+                    future.cancel()
+                for _, _, _, search, _ in searches:
+                    if isinstance(search, Future):
+                        search.cancel()
+                raise
+
+        on_road_stops = [start for start, _ in snapped] + [snapped[-1][1]]
+        return full_route_path, on_road_stops
+
+    def _route_time_dependent(self, legs, depart_at, leg_done, bind, stats, token):
+        depart_at = time.time() if depart_at is None else depart_at
+        snapped, full_route_path = [], []
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as fetch_pool:
+            fetch_graph = bind(self.engine.get_graph_for_segment)
+            graph_futures = [fetch_pool.submit(fetch_graph, start, end, 1.0) for start, end in legs]
+            try:
+                for i, ((start, end), graph_future) in enumerate(zip(legs, graph_futures)):
+                    graph = _result(graph_future, token)
+                    orig_node, dest_node = self.engine.snap_to_nodes(graph, [start, end])
+                    snapped.append((self.engine.get_node_coords(graph, orig_node),
+                                    self.engine.get_node_coords(graph, dest_node)))
+
+                    with instrumentation.phase("search"):
+                        segment_path, arrive_at, search_stats = self.engine.time_dependent_path(
+                            graph, orig_node, dest_node, depart_at
+                        )
+                    stats.add_search(search_stats)
+                    if not segment_path:
+                        raise Exception(f"Could not find path between Stop {i + 1} and Stop {i + 2}")
+                    stats.schedule.append((depart_at, arrive_at))
+                    leg_done(i, segment_path)
+                    full_route_path.extend(segment_path)
+                    depart_at = arrive_at
+            except BaseException:
+                for future in graph_futures:
+                    future.cancel()
+                raise
+
+        on_road_stops = [start for start, _ in snapped] + [snapped[-1][1]]
+        return full_route_path, on_road_stops
+
+
+def _result(future, token):
+    """``future.result()``, but raise RouteCancelled as soon as ``token`` is cancelled."""
+    while not wait([future], timeout=CANCEL_POLL_SECONDS).done:
+        token.check()
+    token.check()
+    return future.result()
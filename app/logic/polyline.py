@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_M
+
+# Points closer than this many screen pixels to the simplified line are dropped
+PIXEL_TOLERANCE = 1.5
+
+# Web Mercator ground resolution at zoom 0 on the equator, meters per 256-px-tile pixel
+METERS_PER_PIXEL_Z0 = 2 * math.pi * EARTH_RADIUS_M / 256
+
+MAX_ZOOM = 22
+
+# Ranges longer than this are measured with numpy; shorter ones are faster in plain Python
+NUMPY_MIN_RANGE = 48
+
+
+class SimplifiedPath:
+    """A ``[(lat, lon), ...]`` polyline that can be drawn at any level of detail.
+
+    One Douglas-Peucker pass ranks every point by the tolerance (in meters)
+    below which it must be kept, so any simplification level is just the
+    points ranked above a threshold; levels are cached per zoom. Endpoints are
+    always kept.
+    """
+
+    def __init__(self, path):
+        self.path = list(path)
+        self.importance = douglas_peucker_importance(self.path)
+        self._levels = {}
+
+    def at_tolerance(self, tolerance_m):
+        if len(self.path) <= 2:
+            return self.path
+        keep = np.flatnonzero(self.importance >= tolerance_m)
+        return [self.path[i] for i in keep]
+
+    def for_zoom(self, zoom):
+        """Points worth drawing at map ``zoom``: detail finer than ``PIXEL_TOLERANCE`` pixels is dropped."""
+        zoom = max(0, min(int(round(zoom)), MAX_ZOOM))
+        level = self._levels.get(zoom)
+        if level is None:
+            level = self.at_tolerance(tolerance_for_zoom(zoom, self._mid_lat()))
+            self._levels[zoom] = level
+        return level
+
+    def _mid_lat(self):
+        return self.path[len(self.path) // 2][0] if self.path else 0.0
+
+
+def tolerance_for_zoom(zoom, lat):
+    """Meters covered by ``PIXEL_TOLERANCE`` screen pixels at ``zoom`` and latitude ``lat``."""
+    return PIXEL_TOLERANCE * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def douglas_peucker_importance(path):
+    """Per-point Douglas-Peucker tolerance in meters; keeping ``importance >= t`` simplifies to ``t``.
+
+    A point's importance is its distance from the chord of the range it split,
+    capped by its parent's, so the kept set shrinks monotonically as ``t`` grows.
+    """
+    n = len(path)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+    if n <= 2:
+        return importance
+
+    # Local equirectangular projection to meters; plenty accurate for a route's extent
+    coords = np.asarray(path, dtype=np.float64)
+    lat0 = math.radians(float(coords[:, 0].mean()))
+    y = np.radians(coords[:, 0]) * EARTH_RADIUS_M
+    x = np.radians(coords[:, 1]) * EARTH_RADIUS_M * math.cos(lat0)
+    xs, ys = x.tolist(), y.tolist()
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, cap = stack.pop()
+        if last - first < 2:
+            continue
+        if last - first > NUMPY_MIN_RANGE:
+            split, dist = _farthest_numpy(x, y, first, last)
+        else:
+            split, dist = _farthest(xs, ys, first, last)
+        value = min(dist, cap)
+        importance[split] = value
+        stack.append((first, split, value))
+        stack.append((split, last, value))
+    return importance
+
+
+def _farthest_numpy(x, y, first, last):
+    """``(index, meters)`` of the point strictly between ``first`` and ``last`` farthest from their chord."""
+    px, py = x[first + 1:last], y[first + 1:last]
+    dx, dy = x[last] - x[first], y[last] - y[first]
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        dist = np.hypot(px - x[first], py - y[first])
+    else:
+        t = np.clip(((px - x[first]) * dx + (py - y[first]) * dy) / length_sq, 0.0, 1.0)
+        dist = np.hypot(px - (x[first] + t * dx), py - (y[first] + t * dy))
+    i = int(np.argmax(dist))
+    return first + 1 + i, float(dist[i])
+
+
+def _farthest(xs, ys, first, last):
+    """Pure-Python ``_farthest_numpy``; cheaper than array setup on short ranges."""
+    x1, y1 = xs[first], ys[first]
+    dx, dy = xs[last] - x1, ys[last] - y1
+    length_sq = dx * dx + dy * dy
+    best, best_dist = first + 1, -1.0
+    for i in range(first + 1, last):
+        px, py = xs[i] - x1, ys[i] - y1
+        if length_sq:
+            t = (px * dx + py * dy) / length_sq
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            px, py = px - t * dx, py - t * dy
+        dist = math.hypot(px, py)
+        if dist > best_dist:
+            best, best_dist = i, dist
+    return best, best_dist
@@ -1,137 +1,505 @@
-import heapq
-import osmnx as ox
-import networkx as nx
-import googlemaps
-from geopy.distance import great_circle
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import os
 import config
 
+from .cache_manager import CacheManager
+from .compiled_graph import CompiledGraph
+from .contraction import CH_EXTENSION, ContractionHierarchy
+from .geo import haversine, travel_time_bound
+from .graph_cache import Circle, GraphCache, TileSet
+from . import cancellation, instrumentation, speed_profiles
+from .graph_store import GRAPH_EXTENSION, GraphFormatError, GraphNotCachedError, load_graph, save_graph
+from .landmarks import ALT_EXTENSION, LandmarkTable
+from .leg_cache import LegCache
+from .search import a_star, bidirectional_a_star, dijkstra_to_targets, time_dependent_a_star
+from .tiles import TileStore
+from .traffic import TrafficService, create_provider
+from .tsp import optimize_order
+
 
 class RoutingEngine:
     """Optimized A* Pathfinding Engine with Traffic Awareness"""
 
-    def __init__(self):
-        # Initialize Google Maps Client for Traffic Data
-        self.gmaps = googlemaps.Client(key=config.GOOGLE_MAPS_API_KEY)
+    PREPROCESSORS = {
+        "ch": (ContractionHierarchy, CH_EXTENSION),
+        "alt": (LandmarkTable, ALT_EXTENSION),
+    }
+
+    def __init__(self, search_only=False):
+        """``search_only`` engines (pipeline worker processes) only search graphs handed to them:
+        no traffic service, tile store or disk cache manifest, just preprocessed files read from ``cache/``.
+        """
+        self.graph_cache = GraphCache(config.GRAPH_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.leg_cache = LegCache(config.LEG_CACHE_SIZE)
+        self._preprocessed = OrderedDict()
+        self._heuristics = OrderedDict()
+        # Guards the two LRUs above; service threads and inline legs search concurrently
+        self._memo_lock = threading.Lock()
+        self._search_local = threading.local()
+        self._load_locks = {}
+        self._load_locks_guard = threading.Lock()
+        if search_only:
+            self.traffic = self.disk_cache = self.tile_store = None
+            return
+        # Traffic data (Google, a local file or a static stand-in), batched and cached
+        self.traffic = TrafficService(create_provider())
+        self.disk_cache = CacheManager(config.CACHE_DIR, config.CACHE_DISK_BUDGET_MB * 1024 * 1024,
+                                       config.OSMNX_CACHE_MAX_AGE_HOURS * 3600)
+        self.tile_store = TileStore(os.path.join(config.CACHE_DIR, "tiles"), config.GRAPH_TILE_SIZE_DEG,
+                                    self.disk_cache)
+
+    @property
+    def last_search_stats(self):
+        """Stats of the last search run on the calling thread (see ``a_star_algorithm``)."""
+        return getattr(self._search_local, "stats", {})
+
+    @last_search_stats.setter
+    def last_search_stats(self, stats):
+        self._search_local.stats = stats
 
     def haversine_distance(self, coord1, coord2):
-        return great_circle(coord1, coord2).meters
+        return haversine(coord1[0], coord1[1], coord2[0], coord2[1])
+
+    def heuristic_array(self, graph, node_index):
+        """Straight-line travel-time bound from every node to ``node_index``, as a list.
+
+        Computed in one vectorised pass and kept for a few recent targets, so
+        repeated queries to the same stop skip even that.
+        """
+        key = (graph.fingerprint(), node_index)
+        with self._memo_lock:
+            estimates = self._heuristics.get(key)
+            if estimates is not None:
+                self._heuristics.move_to_end(key)
+                return estimates
+        estimates = travel_time_bound(graph, node_index).tolist()
+        with self._memo_lock:
+            self._heuristics[key] = estimates
+            if len(self._heuristics) > 8:
+                self._heuristics.popitem(last=False)
+        return estimates
 
     def get_traffic_multiplier(self, start_coords, end_coords, free_flow_seconds):
-        try:
-            result = self.gmaps.distance_matrix(
-                origins=[start_coords],
-                destinations=[end_coords],
-                mode="driving",
-                departure_time="now"
-            )
-
-            element = result['rows'][0]['elements'][0]
-            if element['status'] == 'OK':
-                real_duration = element['duration_in_traffic']['value']
+        with instrumentation.phase("traffic"):
+            return self.traffic.multipliers([(start_coords, end_coords, free_flow_seconds)])[0]
 
-                if free_flow_seconds < 10: return 1.0
+    def get_traffic_snapshot(self, legs):
+        """``(factor, expires_at)`` for every ``(start, end)`` leg, in one provider request."""
+        with instrumentation.phase("traffic"):
+            return self.traffic.snapshot([
+                (start, end, self.estimate_free_flow_seconds(start, end)) for start, end in legs
+            ])
 
-                # Basic ratio: Real Time / Free Flow Time
-                ratio = real_duration / free_flow_seconds
+    def estimate_free_flow_seconds(self, start_coords, end_coords):
+        return self.haversine_distance(start_coords, end_coords) / 8.3
 
-
-                if ratio > 1.5:
-                    return ratio ** 2  # Exponential penalty for heavy traffic
-                else:
-                    return ratio
-
-        except Exception as e:
-            print(f"Traffic fetch failed: {e}")
-
-        return 1.0
-
-    def get_graph_for_segment(self, start_coords, end_coords):
+    def get_graph_for_segment(self, start_coords, end_coords, traffic_factor=None):
         mid_lat = (start_coords[0] + end_coords[0]) / 2
         mid_lon = (start_coords[1] + end_coords[1]) / 2
         dist_between = self.haversine_distance(start_coords, end_coords)
 
-        # Buffer radius (same logic as before)
-        radius = max(2000, dist_between * 0.8)
-
-
-        filename = f"graph_{mid_lat:.3f}_{mid_lon:.3f}_{int(radius / 100) * 100}.graphml"
-        filepath = os.path.join(config.CACHE_DIR, filename)
-
-        if os.path.exists(filepath):
-            print(f"Loading graph from cache: {filename}")
-            # Load from disk (Fast!)
-            graph = ox.load_graphml(filepath)
-        else:
-            print(f"Downloading new graph: {filename}")
-
-            graph = ox.graph_from_point((mid_lat, mid_lon), dist=radius, network_type='drive')
-
-
-            os.makedirs(config.CACHE_DIR, exist_ok=True)
-            ox.save_graphml(graph, filepath)
-
-        graph = ox.add_edge_speeds(graph)
-        graph = ox.add_edge_travel_times(graph)
-
-        # Calculate traffic (same as before)
-        estimated_free_seconds = dist_between / 8.3
-        traffic_factor = self.get_traffic_multiplier(start_coords, end_coords, estimated_free_seconds)
-
-        for u, v, k, data in graph.edges(keys=True, data=True):
-            base_time = data.get('travel_time', 1)
-            data['traffic_weight'] = base_time * traffic_factor
-
+        with instrumentation.phase("graph_fetch"):
+            if config.USE_GRAPH_TILES:
+                graph = self.get_tiled_graph(start_coords, end_coords, dist_between)
+            else:
+                # Buffer radius (same logic as before)
+                radius = max(2000, dist_between * 0.8)
+                graph = self.get_radius_graph((mid_lat, mid_lon), radius)
+
+        # Multi-leg routes pass in a factor from one batched lookup
+        if traffic_factor is None:
+            estimated_free_seconds = self.estimate_free_flow_seconds(start_coords, end_coords)
+            traffic_factor = self.get_traffic_multiplier(start_coords, end_coords, estimated_free_seconds)
+
+        return graph.scaled(traffic_factor)
+
+    def get_tiled_graph(self, start_coords, end_coords, dist_between):
+        """Stitch just the tiles along the leg's corridor, reusing any already-stitched superset."""
+        buffer_m = max(config.TILE_CORRIDOR_BUFFER_M, dist_between * 0.3)
+        keys = self.tile_store.tiles_for_corridor(start_coords, end_coords, buffer_m)
+        if not config.ALLOW_DOWNLOADS:
+            # Offline, e.g. on an imported extract: the corridor may run past the cached area
+            keys = self.tile_store.cached_keys(keys, [start_coords, end_coords])
+        return self.get_stitched_graph(keys)
+
+    def get_stitched_graph(self, keys):
+        cache_key = "tiles_" + "_".join(f"{row}:{col}" for row, col in sorted(keys))
+        region = TileSet(keys)
+        with self._load_lock(cache_key):
+            graph = self.graph_cache.get(cache_key, region)
+            instrumentation.count("graph_memory_hits" if graph is not None else "graph_memory_misses")
+            if graph is None:
+                graph = self.tile_store.stitch(keys)
+                self.graph_cache.put(cache_key, graph, region)
         return graph
 
-    def get_node_coords(self, graph, node_id):
-        node = graph.nodes[node_id]
-        return node['y'], node['x']
-
-    def a_star_algorithm(self, graph, start_node, end_node):
-        open_set = []
-        heapq.heappush(open_set, (0, start_node))
-        came_from = {}
-
-        g_score = {node: float('inf') for node in graph.nodes}
-        g_score[start_node] = 0
-
-        target_coords = (graph.nodes[end_node]['y'], graph.nodes[end_node]['x'])
-
-        while open_set:
-            _, current = heapq.heappop(open_set)
-
-            if current == end_node:
-                return self.reconstruct_path(came_from, current, graph)
-
-            for neighbor in graph.neighbors(current):
-                edge_data = graph.get_edge_data(current, neighbor)
-
-                weight = min(d.get('traffic_weight', float('inf')) for d in edge_data.values())
+    def get_graph_for_stops(self, stops):
+        """One untrafficked graph covering every stop, for matrices and stop ordering."""
+        if config.USE_GRAPH_TILES:
+            keys = self.tile_store.tiles_for_area(stops, config.TILE_CORRIDOR_BUFFER_M)
+            if not config.ALLOW_DOWNLOADS:
+                keys = self.tile_store.cached_keys(keys, stops)
+            return self.get_stitched_graph(keys)
+
+        center = (sum(lat for lat, _ in stops) / len(stops), sum(lon for _, lon in stops) / len(stops))
+        radius = max(2000, max(self.haversine_distance(center, stop) for stop in stops) * 1.3)
+        return self.get_radius_graph(center, radius)
+
+    def get_radius_graph(self, center, radius):
+        basename = f"graph_{center[0]:.3f}_{center[1]:.3f}_{int(radius / 100) * 100}"
+        region = Circle(center, radius)
+        with self._load_lock(basename):
+            graph = self.graph_cache.get(basename, region)
+            instrumentation.count("graph_memory_hits" if graph is not None else "graph_memory_misses")
+            if graph is None:
+                # A larger graph already on disk serves this area too, without a download
+                covering = self.disk_cache.find_graph(region)
+                if covering is not None:
+                    path, center, radius = covering
+                    basename = os.path.basename(path)[:-len(GRAPH_EXTENSION)]
+                    region = Circle(center, radius)
+                graph = self.load_cached_graph(basename, center, radius)
+                self.graph_cache.put(basename, graph, region)
+        return graph
 
-                tentative_g_score = g_score[current] + weight
+    def warm_up(self, center, radius_m=None, max_graphs=None):
+        """Load cached graphs around ``center`` into memory; returns how many were loaded.
+
+        Reads the cache only, never downloads. Cached tiles within ``radius_m``
+        are stitched into one graph whose tile set covers later legs in the
+        area, and the ``max_graphs`` most recently written point-radius graphs
+        centred within ``radius_m`` are loaded as well, going by the manifest.
+        """
+        radius_m = config.WARMUP_RADIUS_M if radius_m is None else radius_m
+        max_graphs = config.WARMUP_MAX_GRAPHS if max_graphs is None else max_graphs
+        loaded = 0
+
+        keys = [
+            key for key in self.tile_store.tiles_for_area([center], radius_m)
+            if os.path.exists(self.tile_store.tile_path(key))
+        ]
+        if keys:
+            self.get_stitched_graph(keys)
+            loaded += 1
+
+        for _, graph_center, radius in self.disk_cache.recent_graphs(center, radius_m, max_graphs):
+            self.get_radius_graph(graph_center, radius)
+            loaded += 1
+        return loaded
+
+    def _load_lock(self, key):
+        """Per-cache-key lock so legs fetched in parallel never load the same graph twice."""
+        with self._load_locks_guard:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def load_cached_graph(self, basename, center, radius):
+        """Binary cache first, then a one-off GraphML migration, then a fresh download."""
+        binary_path = os.path.join(config.CACHE_DIR, basename + GRAPH_EXTENSION)
+        graphml_path = os.path.join(config.CACHE_DIR, basename + ".graphml")
+
+        graph = self._read_cached_graph(binary_path)
+        if graph is not None:
+            return graph
+
+        # Another process may be downloading the same graph; wait for it, then use its file
+        with self.disk_cache.lock(binary_path):
+            graph = self._read_cached_graph(binary_path)
+            if graph is None:
+                graph = self._build_graph(basename, center, radius, graphml_path)
+                os.makedirs(config.CACHE_DIR, exist_ok=True)
+                with instrumentation.phase("graph_save"):
+                    save_graph(graph, binary_path, meta={"center": list(center), "radius": radius})
+                self.disk_cache.record(binary_path, "graph", center=center, radius=radius)
+        return graph
 
-                if tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
+    def _read_cached_graph(self, binary_path):
+        if not os.path.exists(binary_path):
+            return None
+        try:
+            with instrumentation.phase("graph_load"):
+                graph, _ = load_graph(binary_path)
+        except GraphFormatError as e:
+            print(f"Discarding unreadable graph cache: {e}")
+            self.disk_cache.forget(binary_path)
+            return None
+        print(f"Loading graph from cache: {os.path.basename(binary_path)}")
+        self.disk_cache.touch(binary_path)
+        return graph
 
-                    dist_to_target = self.haversine_distance(
-                        (graph.nodes[neighbor]['y'], graph.nodes[neighbor]['x']),
-                        target_coords
-                    )
-                    h_score_seconds = dist_to_target / 28.0
+    def _build_graph(self, basename, center, radius, graphml_path):
+        """Compile a graph from a legacy GraphML cache or a fresh download."""
+        if not os.path.exists(graphml_path) and not config.ALLOW_DOWNLOADS:
+            raise GraphNotCachedError(f"Graph {basename} is not cached and downloads are disabled")
 
-                    f_score = tentative_g_score + h_score_seconds
+        # Imported here: osmnx pulls in geopandas and shapely, which cached routing never needs
+        import osmnx as ox
 
-                    heapq.heappush(open_set, (f_score, neighbor))
-        return None
+        if os.path.exists(graphml_path):
+            print(f"Migrating cached GraphML to binary: {basename}")
+            with instrumentation.phase("graphml_load"):
+                nx_graph = ox.load_graphml(graphml_path)
+        else:
+            cancellation.check()
+            print(f"Downloading new graph: {basename}")
+            with instrumentation.phase("download"):
+                nx_graph = ox.graph_from_point(center, dist=radius, network_type='drive')
+
+        with instrumentation.phase("edge_speeds"):
+            nx_graph = ox.add_edge_speeds(nx_graph)
+            nx_graph = ox.add_edge_travel_times(nx_graph)
+        with instrumentation.phase("compile"):
+            return CompiledGraph.from_networkx(nx_graph)
+
+    def get_node_coords(self, graph, node_index):
+        return graph.coords(node_index)
+
+    def nearest_node(self, graph, lat, lon):
+        """Index of the graph node closest to ``(lat, lon)``."""
+        return graph.nearest_node(lat, lon)
+
+    def snap_to_nodes(self, graph, points):
+        """Nearest node index for every ``(lat, lon)`` in ``points``, via the graph's grid index."""
+        with instrumentation.phase("snap"):
+            index = graph.spatial_index()
+            return [index.nearest(graph.lat, graph.lon, lat, lon)[0] for lat, lon in points]
+
+    def snap_to_edges(self, graph, points):
+        """``EdgeSnap`` (closest edge and the point on it) for every ``(lat, lon)`` in ``points``.
+
+        More faithful than node snapping on long roads, where the nearest node
+        can be far away or on a different street than the nearest road.
+        """
+        with instrumentation.phase("snap"):
+            index = graph.edge_index()
+            return [index.nearest(graph, lat, lon) for lat, lon in points]
+
+    def travel_time_matrix(self, stops, graph=None):
+        """``(n, n)`` array of seconds from each stop to every other (``inf`` if unreachable).
+
+        One Dijkstra per stop that stops once all the other stops are settled,
+        instead of an A* run per ordered pair. Uses free-flow times unless
+        ``graph`` already carries a traffic layer.
+        """
+        graph = graph if graph is not None else self.get_graph_for_stops(stops)
+        nodes = self.snap_to_nodes(graph, stops)
+        matrix = np.full((len(stops), len(stops)), np.inf)
+        for i, node in enumerate(nodes):
+            dist = dijkstra_to_targets(graph, node, nodes)
+            matrix[i] = [dist[target] for target in nodes]
+        return matrix
+
+    def optimize_stop_order(self, stops, return_to_start=False, keep_last=False, time_budget=None):
+        """Visiting order (indices into ``stops``, starting at 0) with the least total travel time."""
+        if len(stops) <= 2:
+            return list(range(len(stops)))
+        time_budget = config.STOP_ORDER_TIME_BUDGET if time_budget is None else time_budget
+        matrix = self.travel_time_matrix(stops)
+        return optimize_order(matrix, return_to_start, keep_last, time_budget)
+
+    def compile_graph(self, graph):
+        if isinstance(graph, CompiledGraph):
+            return graph
+        return CompiledGraph.from_networkx(graph, weight='traffic_weight')
+
+    def find_path(self, graph, start_node, end_node, mode=None, depart_at=None):
+        """Route with the configured search mode; same ``(lat, lon)`` path in every mode.
+
+        ``depart_at`` (epoch seconds, default now) only matters in ``"time_dependent"`` mode.
+        """
+        mode = mode or config.SEARCH_MODE
+        with instrumentation.phase("search"):
+            if mode == "time_dependent":
+                path, _, self.last_search_stats = self.time_dependent_path(graph, start_node, end_node, depart_at)
+            elif mode == "ch":
+                path = self.contraction_hierarchy_path(graph, start_node, end_node)
+            elif mode == "alt":
+                path = self.a_star_algorithm(graph, start_node, end_node, heuristic="alt")
+            elif mode == "bidirectional":
+                path = self.bidirectional_a_star(graph, start_node, end_node)
+            else:
+                path = self.a_star_algorithm(graph, start_node, end_node)
+        instrumentation.current().add_search(self.last_search_stats)
+        return path
+
+    def get_preprocessed(self, graph, kind, build=False):
+        """Derived search data (``"ch"`` or ``"alt"``) for this graph from memory or disk.
+
+        Files live under ``cache/<kind>/`` named by the graph fingerprint, so a
+        graph whose topology or base times change simply finds nothing there.
+        """
+        cls, extension = self.PREPROCESSORS[kind]
+        fingerprint = graph.fingerprint()
+        key = (kind, fingerprint)
+        with self._memo_lock:
+            data = self._preprocessed.get(key)
+            if data is not None:
+                self._preprocessed.move_to_end(key)
+                return data
+
+        path = os.path.join(config.CACHE_DIR, kind, fingerprint + extension)
+        if os.path.exists(path):
+            try:
+                with instrumentation.phase("preprocess_load"):
+                    data = cls.load(path)
+                if self.disk_cache is not None:
+                    self.disk_cache.touch(path)
+            except GraphFormatError as e:
+                print(f"Discarding unreadable {kind} data: {e}")
+                if self.disk_cache is not None:
+                    self.disk_cache.forget(path)
+
+        if data is None and build:
+            print(f"Preprocessing {kind} for {graph.num_nodes} nodes...")
+            with instrumentation.phase("preprocess_build"):
+                if kind == "alt":
+                    data = cls.build(graph, count=config.ALT_LANDMARK_COUNT)
+                else:
+                    data = cls.build(graph)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data.save(path)
+            if self.disk_cache is not None:
+                self.disk_cache.record(path, kind)
+
+        if data is not None:
+            with self._memo_lock:
+                self._preprocessed[key] = data
+                if len(self._preprocessed) > 8:
+                    self._preprocessed.popitem(last=False)
+        return data
+
+    def prepare_search(self, graph, mode=None):
+        """Load, or build as configured, the preprocessed data a ``mode`` search on ``graph`` reads.
+
+        Called before legs go to worker processes, so each worker loads the file
+        from ``cache/`` instead of building its own copy.
+        """
+        mode = mode or config.SEARCH_MODE
+        if mode == "alt":
+            self.get_preprocessed(graph, "alt", build=config.BUILD_LANDMARKS_ON_DEMAND)
+        elif mode == "ch":
+            self.get_hierarchy(graph, build=config.BUILD_CH_ON_DEMAND)
+
+    def get_hierarchy(self, graph, build=False):
+        return self.get_preprocessed(graph, "ch", build)
+
+    def contraction_hierarchy_path(self, graph, start_node, end_node):
+        """CH query on a preprocessed graph; plain A* if the hierarchy is missing or stale."""
+        hierarchy = self.get_hierarchy(graph, build=config.BUILD_CH_ON_DEMAND)
+        if hierarchy is None or not hierarchy.is_valid_for(graph):
+            return self.a_star_algorithm(graph, start_node, end_node)
+
+        started = time.perf_counter()
+        result = hierarchy.query(start_node, end_node)
+        self.last_search_stats = {"heuristic": "ch", "seconds": time.perf_counter() - started}
+        if result is None:
+            return None
+        nodes, _ = result
+        return [graph.coords(i) for i in nodes]
+
+    def a_star_algorithm(self, graph, start_node, end_node, heuristic="haversine"):
+        """Nodes are indices on a CompiledGraph and OSM ids on a networkx graph.
+
+        ``heuristic`` is ``"haversine"`` (straight line at 28 m/s) or ``"alt"``
+        (landmark lower bounds, falling back to haversine without valid landmarks).
+        Search counters (nodes popped and expanded, stale entries skipped,
+        relaxations, peak heap size) and time taken land in ``last_search_stats``.
+        """
+        if not isinstance(graph, CompiledGraph):
+            graph = self.compile_graph(graph)
+            start_node, end_node = graph.index_of(start_node), graph.index_of(end_node)
+
+        started = time.perf_counter()
+        estimate = None
+        if heuristic == "alt":
+            landmarks = self.get_preprocessed(graph, "alt", build=config.BUILD_LANDMARKS_ON_DEMAND)
+            if landmarks is not None and landmarks.is_valid_for(graph):
+                estimate = landmarks.heuristic_array(end_node, graph.weight_scale).tolist().__getitem__
+            else:
+                heuristic = "haversine"
+
+        if estimate is None:
+            estimate = self.heuristic_array(graph, end_node).__getitem__
+
+        stats = {"heuristic": heuristic}
+        came_from = a_star(graph, start_node, end_node, estimate, stats)
+        stats["seconds"] = time.perf_counter() - started
+        self.last_search_stats = stats
+
+        if came_from is None:
+            return None
+        return self.reconstruct_path(came_from, end_node, graph)
+
+    def time_dependent_path(self, graph, start_node, end_node, depart_at=None):
+        """Fastest path leaving at ``depart_at`` (epoch seconds, default now).
+
+        Returns ``(path, arrive_at, search_stats)``; the stats are returned rather
+        than kept in ``last_search_stats`` so concurrent routes can share the engine.
+
+        Edge times follow the graph's speed profile at the moment each edge is
+        entered, independent of live traffic, so trips can be planned offline
+        for any departure. The straight-line heuristic is scaled by the
+        profile's smallest multiplier, keeping it a lower bound at every hour.
+        """
+        depart_at = time.time() if depart_at is None else depart_at
+        profile = graph.speed_profile if graph.speed_profile is not None else speed_profiles.current()
+        midnight = speed_profiles.local_midnight(depart_at)
+
+        started = time.perf_counter()
+        bound = self.heuristic_array(graph, end_node)
+        scale = min(1.0, profile.min_multiplier)
+        estimate = bound.__getitem__ if scale == 1.0 else (lambda i: bound[i] * scale)
+
+        stats = {"heuristic": "haversine"}
+        came_from, arrival = time_dependent_a_star(
+            graph, start_node, end_node, depart_at - midnight, profile.traverse, estimate, stats
+        )
+        stats["seconds"] = time.perf_counter() - started
+
+        if came_from is None:
+            return None, None, stats
+        return self.reconstruct_path(came_from, end_node, graph), midnight + arrival, stats
+
+    def bidirectional_a_star(self, graph, start_node, end_node, heuristic="haversine"):
+        """Forward and backward A* meeting in the middle; same path format as a_star_algorithm."""
+        if not isinstance(graph, CompiledGraph):
+            graph = self.compile_graph(graph)
+            start_node, end_node = graph.index_of(start_node), graph.index_of(end_node)
+
+        started = time.perf_counter()
+        to_target = from_source = None
+        if heuristic == "alt":
+            landmarks = self.get_preprocessed(graph, "alt", build=config.BUILD_LANDMARKS_ON_DEMAND)
+            if landmarks is not None and landmarks.is_valid_for(graph):
+                to_target = landmarks.heuristic_array(end_node, graph.weight_scale)
+                from_source = landmarks.source_heuristic_array(start_node, graph.weight_scale)
+            else:
+                heuristic = "haversine"
+
+        if to_target is None:
+            to_target = travel_time_bound(graph, end_node)
+            from_source = travel_time_bound(graph, start_node)
+
+        with np.errstate(invalid="ignore"):
+            average = np.nan_to_num((to_target - from_source) / 2, nan=0.0)
+        potential = average.tolist().__getitem__
+
+        stats = {"heuristic": heuristic, "bidirectional": True}
+        nodes = bidirectional_a_star(graph, start_node, end_node, potential, stats)
+        stats["seconds"] = time.perf_counter() - started
+        self.last_search_stats = stats
+
+        if nodes is None:
+            return None
+        return [graph.coords(i) for i in nodes]
 
     def reconstruct_path(self, came_from, current, graph):
         path = []
         while current in came_from:
-            node = graph.nodes[current]
-            path.append((node['y'], node['x']))
+            path.append(graph.coords(current))
             current = came_from[current]
-        node = graph.nodes[current]
-        path.append((node['y'], node['x']))
+        path.append(graph.coords(current))
         return path[::-1]
+
@@ -0,0 +1,231 @@
+import heapq
+
+import numpy as np
+
+from .cancellation import CHECK_INTERVAL, check
+
+
+def a_star(graph, source, target, heuristic, stats=None):
+    """A* over a CompiledGraph between two node indices.
+
+    ``heuristic(i)`` returns the estimated seconds from node ``i`` to the target.
+    Scores live in dicts, so only the nodes the search actually touches are
+    ever initialised. Returns the ``came_from`` map, or None if unreachable.
+    If a ``stats`` dict is given, the search counters are recorded in it.
+    """
+    g_score = {source: 0.0}
+    came_from = {}
+    open_set = [(heuristic(source), 0.0, source)]
+    popped = stale = relaxations = 0
+    peak_heap = 1
+
+    while open_set:
+        if len(open_set) > peak_heap:
+            peak_heap = len(open_set)
+        _, g, current = heapq.heappop(open_set)
+        popped += 1
+        if not popped % CHECK_INTERVAL:
+            check()
+
+        if current == target:
+            break
+
+        # Stale heap entry: a cheaper route to this node was already expanded
+        if g > g_score[current]:
+            stale += 1
+            continue
+
+        for neighbor, weight in graph.neighbors(current):
+            tentative_g_score = g + weight
+
+            if tentative_g_score < g_score.get(neighbor, float('inf')):
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g_score
+                relaxations += 1
+                heapq.heappush(open_set, (tentative_g_score + heuristic(neighbor), tentative_g_score, neighbor))
+    else:
+        came_from = None
+
+    if stats is not None:
+        _record(stats, popped, stale, relaxations, peak_heap)
+    return came_from
+
+
+def time_dependent_a_star(graph, source, target, depart, traverse, heuristic, stats=None):
+    """Earliest-arrival A* where edge costs depend on the time the edge is entered.
+
+    Labels are arrival times: relaxing an edge calls ``traverse(base_seconds,
+    road_class, t)`` with the arrival time ``t`` at its tail. Provided
+    ``traverse`` is FIFO (entering later never exits earlier) and
+    ``heuristic`` never overestimates the remaining time at any hour, the
+    first pop of ``target`` is optimal. Returns ``(came_from, arrival)``, or
+    ``(None, None)`` if unreachable.
+    """
+    arrival = {source: depart}
+    came_from = {}
+    open_set = [(depart + heuristic(source), depart, source)]
+    popped = stale = relaxations = 0
+    peak_heap = 1
+    reached = None
+
+    while open_set:
+        if len(open_set) > peak_heap:
+            peak_heap = len(open_set)
+        _, t, current = heapq.heappop(open_set)
+        popped += 1
+        if not popped % CHECK_INTERVAL:
+            check()
+
+        if current == target:
+            reached = t
+            break
+
+        if t > arrival[current]:
+            stale += 1
+            continue
+
+        for neighbor, base_seconds, road_class in graph.timed_neighbors(current):
+            tentative = traverse(base_seconds, road_class, t)
+            if tentative < arrival.get(neighbor, float('inf')):
+                came_from[neighbor] = current
+                arrival[neighbor] = tentative
+                relaxations += 1
+                heapq.heappush(open_set, (tentative + heuristic(neighbor), tentative, neighbor))
+
+    if stats is not None:
+        _record(stats, popped, stale, relaxations, peak_heap)
+    if reached is None:
+        return None, None
+    return came_from, reached
+
+
+def _record(stats, popped, stale, relaxations, peak_heap):
+    stats['nodes_popped'] = popped
+    stats['stale_skipped'] = stale
+    stats['nodes_expanded'] = popped - stale
+    stats['relaxations'] = relaxations
+    stats['peak_heap'] = peak_heap
+
+
+def dijkstra(graph, source):
+    """Full one-to-all Dijkstra; returns ``(dist, parent)`` arrays (inf / -1 where unreachable)."""
+    dist = np.full(graph.num_nodes, np.inf)
+    parent = np.full(graph.num_nodes, -1, dtype=np.int64)
+    best = {source: 0.0}
+    settled = set()
+    heap = [(0.0, source)]
+
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled.add(node)
+        if not len(settled) % CHECK_INTERVAL:
+            check()
+        dist[node] = d
+
+        for neighbor, weight in graph.neighbors(node):
+            nd = d + weight
+            if nd < best.get(neighbor, float('inf')):
+                best[neighbor] = nd
+                parent[neighbor] = node
+                heapq.heappush(heap, (nd, neighbor))
+    return dist, parent
+
+
+def dijkstra_to_targets(graph, source, targets):
+    """One-to-many Dijkstra that stops as soon as every node in ``targets`` is settled.
+
+    Returns ``{target: seconds}``, with ``inf`` for targets that are unreachable.
+    """
+    remaining = set(targets)
+    found = {}
+    best = {source: 0.0}
+    settled = set()
+    heap = [(0.0, source)]
+
+    while heap and remaining:
+        d, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled.add(node)
+        if not len(settled) % CHECK_INTERVAL:
+            check()
+        if node in remaining:
+            remaining.discard(node)
+            found[node] = d
+
+        for neighbor, weight in graph.neighbors(node):
+            nd = d + weight
+            if nd < best.get(neighbor, float('inf')):
+                best[neighbor] = nd
+                heapq.heappush(heap, (nd, neighbor))
+
+    for target in remaining:
+        found[target] = float('inf')
+    return found
+
+
+def bidirectional_a_star(graph, source, target, potential, stats=None):
+    """Bidirectional A* with the average potential of Ikeda et al.
+
+    ``potential(i)`` must be ``(h_target(i) - h_source(i)) / 2`` for consistent
+    estimates ``h_target`` (to the target) and ``h_source`` (from the source).
+    The forward search uses it and the backward search (over reversed edges)
+    its negation, so both see the same reduced edge costs and the search may
+    stop as soon as the two smallest keys sum to at least the best path found.
+    Returns the node-index path, or None if unreachable.
+    """
+    if source == target:
+        return [source]
+
+    reverse = graph.reverse()
+    dist = ({source: 0.0}, {target: 0.0})
+    parent = ({}, {})
+    heaps = ([(potential(source), source)], [(-potential(target), target)])
+    sides = ((graph, 1.0), (reverse, -1.0))
+    best, meeting = float('inf'), None
+    popped = stale = relaxations = 0
+    peak_heap = 2
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        own_dist, other_dist = dist[side], dist[1 - side]
+        direction_graph, sign = sides[side]
+
+        if len(heaps[0]) + len(heaps[1]) > peak_heap:
+            peak_heap = len(heaps[0]) + len(heaps[1])
+        key, node = heapq.heappop(heaps[side])
+        popped += 1
+        if not popped % CHECK_INTERVAL:
+            check()
+        d = own_dist[node]
+        if key > d + sign * potential(node):
+            stale += 1
+            continue
+
+        for neighbor, weight in direction_graph.neighbors(node):
+            nd = d + weight
+            if nd < own_dist.get(neighbor, float('inf')):
+                own_dist[neighbor] = nd
+                parent[side][neighbor] = node
+                relaxations += 1
+                heapq.heappush(heaps[side], (nd + sign * potential(neighbor), neighbor))
+                if neighbor in other_dist and nd + other_dist[neighbor] < best:
+                    best, meeting = nd + other_dist[neighbor], neighbor
+
+    if stats is not None:
+        _record(stats, popped, stale, relaxations, peak_heap)
+    if meeting is None:
+        return None
+
+    path = [meeting]
+    while path[-1] != source:
+        path.append(parent[0][path[-1]])
+    path.reverse()
+    while path[-1] != target:
+        path.append(parent[1][path[-1]])
+    return path
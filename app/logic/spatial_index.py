@@ -0,0 +1,170 @@
+import math
+
+import numpy as np
+
+from .geo import METERS_PER_DEGREE, haversine_array, haversine_to_point, point_to_segments
+
+# ~550 m cells: a few dozen nodes each in a dense city, so a snap touches a handful of cells
+GRID_CELL_DEG = 0.005
+
+GRID_ARRAYS = ("grid_params", "grid_cell_start", "grid_order")
+
+
+class GridIndex:
+    """Uniform lat/lon grid over a set of points, for nearest-point queries.
+
+    Points are bucketed into ``rows x cols`` cells. ``order`` lists the point
+    indices sorted by row-major cell and ``cell_start`` is its CSR offset array,
+    so the points of a horizontal run of cells are one contiguous slice.
+    """
+
+    def __init__(self, params, cell_start, order):
+        self.params = params
+        south, west, cell_deg, rows, cols = params.tolist()
+        self.south, self.west, self.cell_deg = south, west, cell_deg
+        self.rows, self.cols = int(rows), int(cols)
+        self.cell_start = cell_start
+        self.order = order
+
+    @classmethod
+    def build(cls, lats, lons, cell_deg=GRID_CELL_DEG):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if len(lats) == 0:
+            params = np.array([0.0, 0.0, cell_deg, 1, 1])
+            return cls(params, np.zeros(2, dtype=np.int64), np.empty(0, dtype=np.int32))
+
+        south, west = float(lats.min()), float(lons.min())
+        rows = int((lats.max() - south) // cell_deg) + 1
+        cols = int((lons.max() - west) // cell_deg) + 1
+        cell = ((lats - south) // cell_deg).astype(np.int64) * cols + ((lons - west) // cell_deg).astype(np.int64)
+
+        order = np.argsort(cell, kind="stable").astype(np.int32)
+        cell_start = np.zeros(rows * cols + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=rows * cols), out=cell_start[1:])
+        return cls(np.array([south, west, cell_deg, rows, cols]), cell_start, order)
+
+    def to_arrays(self):
+        return {"grid_params": self.params, "grid_cell_start": self.cell_start, "grid_order": self.order}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """The index stored alongside a graph, or None for files written without one."""
+        if any(name not in arrays for name in GRID_ARRAYS):
+            return None
+        return cls(*(arrays[name] for name in GRID_ARRAYS))
+
+    def _cell_of(self, lat, lon):
+        return math.floor((lat - self.south) / self.cell_deg), math.floor((lon - self.west) / self.cell_deg)
+
+    def _cell_meters(self, lat):
+        """Smallest side of any cell in meters, as seen from ``lat``; bounds the ring search."""
+        widest_lat = max(abs(lat), abs(self.south), abs(self.south + self.rows * self.cell_deg))
+        return 0.999 * self.cell_deg * METERS_PER_DEGREE * max(math.cos(math.radians(widest_lat)), 1e-6)
+
+    def _block(self, row_low, row_high, col_low, col_high):
+        """Point indices in the cells of a rectangular block, clipped to the grid."""
+        row_low, row_high = max(row_low, 0), min(row_high, self.rows - 1)
+        col_low, col_high = max(col_low, 0), min(col_high, self.cols - 1)
+        if row_low > row_high or col_low > col_high:
+            return []
+        return [
+            self.order[self.cell_start[row * self.cols + col_low]:self.cell_start[row * self.cols + col_high + 1]]
+            for row in range(row_low, row_high + 1)
+        ]
+
+    def _ring(self, row, col, k):
+        """Point indices in the cells exactly ``k`` steps (Chebyshev) from ``(row, col)``."""
+        if k == 0:
+            return self._block(row, row, col, col)
+        return (self._block(row - k, row - k, col - k, col + k)
+                + self._block(row + k, row + k, col - k, col + k)
+                + self._block(row - k + 1, row + k - 1, col - k, col - k)
+                + self._block(row - k + 1, row + k - 1, col + k, col + k))
+
+    def nearest(self, lats, lons, lat, lon):
+        """``(index, meters)`` of the indexed point closest to ``(lat, lon)``; ``(-1, inf)`` if empty."""
+        if len(self.order) == 0:
+            return -1, math.inf
+
+        row, col = self._cell_of(lat, lon)
+        cell_m = self._cell_meters(lat)
+        # Once the block of examined rings covers the whole grid there is nothing left to find
+        last_ring = max(abs(row), abs(row - self.rows + 1), abs(col), abs(col - self.cols + 1))
+
+        best, best_dist = -1, math.inf
+        for k in range(last_ring + 1):
+            chunks = self._ring(row, col, k)
+            if chunks:
+                candidates = np.concatenate(chunks)
+                if len(candidates):
+                    dist = haversine_to_point(lats[candidates], lons[candidates], lat, lon)
+                    i = int(np.argmin(dist))
+                    if dist[i] < best_dist:
+                        best, best_dist = int(candidates[i]), float(dist[i])
+            # Anything outside rings 0..k is at least k whole cells away
+            if best_dist <= k * cell_m:
+                break
+        return best, best_dist
+
+    def within(self, lat, lon, radius_m):
+        """Indices of the points in every cell that could lie within ``radius_m`` of ``(lat, lon)``."""
+        row, col = self._cell_of(lat, lon)
+        k = int(math.ceil(radius_m / self._cell_meters(lat)))
+        chunks = self._block(row - k, row + k, col - k, col + k)
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+
+
+class EdgeSnap:
+    """Closest point on the road network: the edge ``u -> v`` and how far along it."""
+
+    def __init__(self, u, v, fraction, coords, distance):
+        self.u = u
+        self.v = v
+        self.fraction = fraction
+        self.coords = coords
+        self.distance = distance
+
+    def nearest_node(self):
+        return self.u if self.fraction < 0.5 else self.v
+
+    def __repr__(self):
+        return f"EdgeSnap({self.u} -> {self.v} at {self.fraction:.2f}, {self.distance:.1f} m)"
+
+
+class EdgeIndex:
+    """Grid over edge midpoints for nearest-edge snapping.
+
+    Every point of an edge lies within half its length of the midpoint, so the
+    closest edge has its midpoint within ``nearest midpoint distance +
+    half the longest edge``; only those candidates get an exact segment test.
+    """
+
+    def __init__(self, graph, cell_deg=GRID_CELL_DEG):
+        self.src = np.repeat(np.arange(graph.num_nodes, dtype=np.int32), np.diff(graph.indptr))
+        self.dst = graph.indices
+        lat1, lon1 = graph.lat[self.src], graph.lon[self.src]
+        lat2, lon2 = graph.lat[self.dst], graph.lon[self.dst]
+        self.mid_lat = (lat1 + lat2) / 2
+        self.mid_lon = (lon1 + lon2) / 2
+        lengths = haversine_array(lat1, lon1, lat2, lon2)
+        self.half_longest = float(lengths.max()) / 2 if len(lengths) else 0.0
+        self.grid = GridIndex.build(self.mid_lat, self.mid_lon, cell_deg)
+
+    def nearest(self, graph, lat, lon):
+        """``EdgeSnap`` for the edge closest to ``(lat, lon)``, or None without edges."""
+        _, mid_dist = self.grid.nearest(self.mid_lat, self.mid_lon, lat, lon)
+        if not math.isfinite(mid_dist):
+            return None
+
+        candidates = self.grid.within(lat, lon, mid_dist + self.half_longest)
+        u, v = self.src[candidates], self.dst[candidates]
+        dist, t = point_to_segments(lat, lon, graph.lat[u], graph.lon[u], graph.lat[v], graph.lon[v])
+        i = int(np.argmin(dist))
+        fraction = float(t[i])
+        ui, vi = int(u[i]), int(v[i])
+        coords = (
+            float(graph.lat[ui] + fraction * (graph.lat[vi] - graph.lat[ui])),
+            float(graph.lon[ui] + fraction * (graph.lon[vi] - graph.lon[ui])),
+        )
+        return EdgeSnap(ui, vi, fraction, coords, float(dist[i]))
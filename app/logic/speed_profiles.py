@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+
+from .compiled_graph import ROAD_CLASSES
+
+BUCKET_SECONDS = 900
+BUCKETS_PER_DAY = 86400 // BUCKET_SECONDS
+
+# Multipliers are stored as uint8 steps of 1/QUANTUM, i.e. 1/32 .. ~8x free-flow time
+QUANTUM = 32
+
+# Built-in profile: free flow at night, these peak multipliers in the rush hours, and a
+# share of the peak congestion through the rest of the day
+RUSH_HOURS = ((7.0, 9.0), (16.5, 19.0))
+RAMP_HOURS = 1.0
+DAYTIME_HOURS = (6.0, 22.0)
+DAYTIME_SHARE = 0.35
+PEAK_MULTIPLIERS = {
+    "other": 1.2, "motorway": 1.8, "trunk": 1.7, "primary": 1.6,
+    "secondary": 1.5, "tertiary": 1.35, "residential": 1.15, "service": 1.05,
+}
+
+
+class SpeedProfile:
+    """Travel-time multipliers per road class and 15-minute bucket of the day.
+
+    ``multipliers[road_class, bucket]`` scales an edge's free-flow travel time
+    while travelling inside that bucket. Edges crossing a bucket boundary
+    continue at the next bucket's speed (``traverse``), so leaving later never
+    means arriving earlier. The quantized uint8 table (768 bytes) is saved
+    inside every cached graph file.
+    """
+
+    def __init__(self, quantized):
+        self.quantized = np.clip(np.asarray(quantized), 1, 255).astype(np.uint8)
+        self.multipliers = self.quantized / QUANTUM
+        self.min_multiplier = float(self.multipliers.min())
+        self._rows = self.multipliers.tolist()
+
+    @classmethod
+    def from_multipliers(cls, multipliers):
+        return cls(np.rint(np.asarray(multipliers, dtype=np.float64) * QUANTUM))
+
+    @classmethod
+    def built_in(cls):
+        hours = (np.arange(BUCKETS_PER_DAY) + 0.5) * BUCKET_SECONDS / 3600
+        weight = np.where((hours >= DAYTIME_HOURS[0]) & (hours < DAYTIME_HOURS[1]), DAYTIME_SHARE, 0.0)
+        for start, end in RUSH_HOURS:
+            ramp = np.clip(np.minimum(hours - (start - RAMP_HOURS), (end + RAMP_HOURS) - hours) / RAMP_HOURS, 0, 1)
+            weight = np.maximum(weight, ramp)
+        peaks = np.array([PEAK_MULTIPLIERS[name] for name in ROAD_CLASSES])
+        return cls.from_multipliers(1.0 + (peaks[:, None] - 1.0) * weight[None, :])
+
+    @classmethod
+    def load(cls, path):
+        """Read a JSON profile::
+
+            {"classes": {"primary": [96 multipliers, from 00:00], ...}, "default": [96 multipliers]}
+
+        Classes left out use ``default``, or the built-in profile without one.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        table = cls.built_in().multipliers.copy()
+        if "default" in data:
+            table[:] = _day(data["default"])
+        for name, values in data.get("classes", {}).items():
+            if name not in ROAD_CLASSES:
+                raise ValueError(f"Unknown road class in speed profile: {name}")
+            table[ROAD_CLASSES.index(name)] = _day(values)
+        return cls.from_multipliers(table)
+
+    def traverse(self, base_seconds, road_class, depart):
+        """Arrival time at the end of an edge entered at ``depart`` (seconds from local midnight)."""
+        row = self._rows[road_class]
+        t = depart
+        remaining = base_seconds
+        bucket = int(t // BUCKET_SECONDS)
+        while True:
+            multiplier = row[bucket % BUCKETS_PER_DAY]
+            boundary = (bucket + 1) * BUCKET_SECONDS
+            if t + remaining * multiplier <= boundary:
+                return t + remaining * multiplier
+            remaining -= (boundary - t) / multiplier
+            t = boundary
+            bucket += 1
+
+
+def _day(values):
+    if len(values) != BUCKETS_PER_DAY:
+        raise ValueError(f"A speed profile needs {BUCKETS_PER_DAY} values per day, got {len(values)}")
+    return values
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def current():
+    """Profile for newly compiled graphs: ``config.SPEED_PROFILE_FILE`` if present, else the built-in one."""
+    global _current
+    with _current_lock:
+        if _current is None:
+            path = config.SPEED_PROFILE_FILE
+            _current = SpeedProfile.load(path) if path and os.path.exists(path) else SpeedProfile.built_in()
+        return _current
+
+
+def local_midnight(timestamp):
+    """Epoch seconds of the local midnight starting the day of ``timestamp``."""
+    return time.mktime(time.localtime(timestamp)[:3] + (0, 0, 0, 0, 0, -1))
@@ -0,0 +1,163 @@
+import math
+import os
+import threading
+
+import config
+
+from . import cancellation, instrumentation
+from .compiled_graph import CompiledGraph
+from .geo import METERS_PER_DEGREE, point_to_segments
+from .graph_store import GRAPH_EXTENSION, GraphFormatError, GraphNotCachedError, load_graph, save_graph
+
+
+class TileStore:
+    """Road network cached as fixed-size lat/lon tiles and stitched per leg.
+
+    Each tile is downloaded once with ``truncate_by_edge`` and without
+    simplification, so every OSM node is kept and roads crossing a tile border
+    share node ids with the neighbouring tile. Stitching is then just a merge
+    on those ids. Tiles are recorded in the ``CacheManager`` manifest, which
+    also serialises downloads of the same tile across processes.
+    """
+
+    def __init__(self, cache_dir, tile_size_deg, disk_cache):
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size_deg
+        self.disk_cache = disk_cache
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def tile_key(self, lat, lon):
+        return math.floor(lat / self.tile_size), math.floor(lon / self.tile_size)
+
+    def tile_bounds(self, key):
+        """``(south, west, north, east)`` of a tile."""
+        row, col = key
+        south, west = row * self.tile_size, col * self.tile_size
+        return south, west, south + self.tile_size, west + self.tile_size
+
+    def tile_path(self, key):
+        row, col = key
+        return os.path.join(self.cache_dir, f"tile_{self.tile_size:g}_{row}_{col}{GRAPH_EXTENSION}")
+
+    def tiles_for_corridor(self, start_coords, end_coords, buffer_m):
+        """Keys of the tiles within ``buffer_m`` of the straight segment between the two points."""
+        lat_pad = buffer_m / METERS_PER_DEGREE
+        cos_lat = max(math.cos(math.radians((start_coords[0] + end_coords[0]) / 2)), 1e-6)
+        lon_pad = lat_pad / cos_lat
+
+        low_row, low_col = self.tile_key(min(start_coords[0], end_coords[0]) - lat_pad,
+                                         min(start_coords[1], end_coords[1]) - lon_pad)
+        high_row, high_col = self.tile_key(max(start_coords[0], end_coords[0]) + lat_pad,
+                                           max(start_coords[1], end_coords[1]) + lon_pad)
+
+        # Half the tile diagonal, so a tile counts as soon as any part of it is in the corridor
+        half_diagonal = self.tile_size * METERS_PER_DEGREE * math.hypot(1, cos_lat) / 2
+
+        keys = []
+        for row in range(low_row, high_row + 1):
+            for col in range(low_col, high_col + 1):
+                south, west, north, east = self.tile_bounds((row, col))
+                distance, _ = point_to_segments((south + north) / 2, (west + east) / 2,
+                                                start_coords[0], start_coords[1], end_coords[0], end_coords[1])
+                if distance <= buffer_m + half_diagonal:
+                    keys.append((row, col))
+        return keys
+
+    def tiles_for_area(self, points, buffer_m):
+        """Keys of every tile in the bounding box of ``points`` padded by ``buffer_m``."""
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+        lat_pad = buffer_m / METERS_PER_DEGREE
+        lon_pad = lat_pad / max(math.cos(math.radians(sum(lats) / len(lats))), 1e-6)
+
+        low_row, low_col = self.tile_key(min(lats) - lat_pad, min(lons) - lon_pad)
+        high_row, high_col = self.tile_key(max(lats) + lat_pad, max(lons) + lon_pad)
+        return [(row, col) for row in range(low_row, high_row + 1) for col in range(low_col, high_col + 1)]
+
+    def load_tile(self, key):
+        # Legs fetched in parallel often share tiles; download each one only once
+        with self._locks_guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            return self._load_tile(key)
+
+    def _load_tile(self, key):
+        path = self.tile_path(key)
+        graph = self._read_tile(path)
+        if graph is not None:
+            return graph
+
+        if not config.ALLOW_DOWNLOADS:
+            raise GraphNotCachedError(f"Tile {key} is not cached and downloads are disabled")
+
+        # Another process routing through the same area may be downloading this tile right now
+        with self.disk_cache.lock(path):
+            graph = self._read_tile(path)
+            if graph is None:
+                graph = self._download_tile(key)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                save_graph(graph, path, meta={"tile": list(key), "tile_size": self.tile_size})
+                self.disk_cache.record(path, "tile", bbox=self.tile_bounds(key))
+        return graph
+
+    def _read_tile(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with instrumentation.phase("tile_load"):
+                graph, meta = load_graph(path)
+        except GraphFormatError as e:
+            print(f"Discarding unreadable tile: {e}")
+            self.disk_cache.forget(path)
+            return None
+        if meta.get("partial") and config.ALLOW_DOWNLOADS:
+            # Cut off at the edge of an imported extract; the download has the whole tile
+            return None
+        self.disk_cache.touch(path)
+        return graph
+
+    def cached_keys(self, keys, points):
+        """The cached tiles among ``keys``, for routing without downloads.
+
+        Raises ``GraphNotCachedError`` unless the tiles under ``points`` (the
+        stops) are all cached; the rest of a corridor may run off the cache.
+        """
+        cached = [key for key in keys if os.path.exists(self.tile_path(key))]
+        missing = sorted({self.tile_key(lat, lon) for lat, lon in points}.difference(cached))
+        if missing:
+            raise GraphNotCachedError(f"Tiles {missing} are not cached and downloads are disabled")
+        return cached
+
+    def _download_tile(self, key):
+        cancellation.check()
+        # Imported here: osmnx pulls in geopandas and shapely, which cached tiles never need
+        import osmnx as ox
+
+        south, west, north, east = self.tile_bounds(key)
+        print(f"Downloading tile {key}")
+        instrumentation.count("tiles_downloaded")
+        try:
+            with instrumentation.phase("download"):
+                nx_graph = ox.graph_from_bbox(
+                    (west, south, east, north), network_type='drive',
+                    simplify=False, retain_all=True, truncate_by_edge=True
+                )
+            with instrumentation.phase("edge_speeds"):
+                nx_graph = ox.add_edge_speeds(nx_graph)
+                nx_graph = ox.add_edge_travel_times(nx_graph)
+            with instrumentation.phase("compile"):
+                graph = CompiledGraph.from_networkx(nx_graph)
+        except ox._errors.InsufficientResponseError:
+            # No drivable roads in this tile (water, parkland...); cache that too
+            graph = CompiledGraph.empty()
+        return graph
+
+    def stitch(self, keys):
+        tiles = []
+        for key in keys:
+            cancellation.check()
+            tiles.append(self.load_tile(key))
+        with instrumentation.phase("stitch"):
+            return CompiledGraph.merge(tiles)
+
@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+
+import config
+
+from . import cancellation, instrumentation
+
+# Distance Matrix allows 100 elements per request; 10 legs -> 10 x 10 origins/destinations
+GOOGLE_MAX_LEGS_PER_REQUEST = 10
+
+
+class TrafficProvider:
+    """Source of current driving times for a batch of legs.
+
+    ``leg_durations`` gets ``[(start, end, free_flow_seconds), ...]`` and returns
+    one duration in seconds per leg, or None where no data is available.
+    """
+
+    def leg_durations(self, legs):
+        raise NotImplementedError
+
+
+class GoogleTrafficProvider(TrafficProvider):
+    """Live traffic from the Distance Matrix API, one request per batch of legs."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._gmaps = None
+
+    @property
+    def gmaps(self):
+        # Created on first use, so engines that never fetch traffic (search workers) need no key
+        if self._gmaps is None:
+            import googlemaps
+            self._gmaps = googlemaps.Client(key=self.api_key)
+        return self._gmaps
+
+    def leg_durations(self, legs):
+        durations = []
+        for offset in range(0, len(legs), GOOGLE_MAX_LEGS_PER_REQUEST):
+            cancellation.check()
+            batch = legs[offset:offset + GOOGLE_MAX_LEGS_PER_REQUEST]
+            try:
+                result = self.gmaps.distance_matrix(
+                    origins=[start for start, _, _ in batch],
+                    destinations=[end for _, end, _ in batch],
+                    mode="driving",
+                    departure_time="now"
+                )
+            except Exception as e:
+                print(f"Traffic fetch failed: {e}")
+                durations.extend([None] * len(batch))
+                continue
+
+            # Leg i is origin i -> destination i: the diagonal of the matrix
+            for i in range(len(batch)):
+                element = result['rows'][i]['elements'][i]
+                if element['status'] == 'OK' and 'duration_in_traffic' in element:
+                    durations.append(element['duration_in_traffic']['value'])
+                else:
+                    durations.append(None)
+        return durations
+
+
+class StaticTrafficProvider(TrafficProvider):
+    """In-memory stand-in: every leg takes free flow time times a fixed ratio."""
+
+    def __init__(self, ratio=1.0):
+        self.ratio = ratio
+
+    def leg_durations(self, legs):
+        return [free_flow * self.ratio for _, _, free_flow in legs]
+
+
+class FileTrafficProvider(TrafficProvider):
+    """Offline traffic snapshot from a JSON file::
+
+        {"default_ratio": 1.2,
+         "legs": [{"origin": [lat, lon], "destination": [lat, lon], "seconds": 840}]}
+
+    Legs are matched on their snapped endpoints; anything else uses ``default_ratio``.
+    """
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.default_ratio = data.get("default_ratio", 1.0)
+        self.known = {
+            snap_leg(leg["origin"], leg["destination"]): leg["seconds"] for leg in data.get("legs", [])
+        }
+
+    def leg_durations(self, legs):
+        return [
+            self.known.get(snap_leg(start, end), free_flow * self.default_ratio)
+            for start, end, free_flow in legs
+        ]
+
+
+def create_provider(name=None):
+    name = name or config.TRAFFIC_PROVIDER
+    if name == "google":
+        return GoogleTrafficProvider(config.GOOGLE_MAPS_API_KEY)
+    if name == "file":
+        return FileTrafficProvider(config.TRAFFIC_FILE)
+    if name == "static":
+        return StaticTrafficProvider(config.TRAFFIC_STATIC_RATIO)
+    raise ValueError(f"Unknown traffic provider: {name}")
+
+
+def snap_leg(start, end):
+    """Endpoints rounded to ~10 m so nearby stops share traffic data."""
+    return (round(start[0], 4), round(start[1], 4), round(end[0], 4), round(end[1], 4))
+
+
+def congestion_multiplier(real_seconds, free_flow_seconds):
+    """Traffic factor applied to edge travel times for one leg."""
+    if real_seconds is None or free_flow_seconds < 10:
+        return 1.0
+
+    # Basic ratio: Real Time / Free Flow Time
+    ratio = real_seconds / free_flow_seconds
+    if ratio > 1.5:
+        return ratio ** 2  # Exponential penalty for heavy traffic
+    return ratio
+
+
+class TrafficService:
+    """Batched, TTL-cached traffic multipliers in front of a TrafficProvider.
+
+    Entries are keyed by snapped endpoints plus a time bucket, so the same leg
+    planned twice within a bucket (and within ``ttl``) costs no external call,
+    and all missing legs of a route go to the provider in one batch.
+    """
+
+    def __init__(self, provider, ttl=None, bucket_seconds=None):
+        self.provider = provider
+        self.ttl = config.TRAFFIC_TTL_SECONDS if ttl is None else ttl
+        self.bucket_seconds = config.TRAFFIC_BUCKET_SECONDS if bucket_seconds is None else bucket_seconds
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def multipliers(self, legs):
+        """Traffic factor for each ``(start, end, free_flow_seconds)`` leg."""
+        return [factor for factor, _ in self.snapshot(legs)]
+
+    def snapshot(self, legs):
+        """``(factor, expires_at)`` for each leg; results derived from a factor should expire with it."""
+        now = time.time()
+        bucket = int(now // self.bucket_seconds)
+        keys = [snap_leg(start, end) + (bucket,) for start, end, _ in legs]
+
+        results = [None] * len(legs)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._cache.get(key)
+                if entry is not None and entry[1] > now:
+                    results[i] = entry
+                    self.hits += 1
+                else:
+                    missing.append(i)
+                    self.misses += 1
+
+        instrumentation.count("traffic_cache_hits", len(legs) - len(missing))
+        if missing:
+            cancellation.check()
+            self.requests += 1
+            instrumentation.count("traffic_requests")
+            durations = self.provider.leg_durations([legs[i] for i in missing])
+            with self._lock:
+                # Never past the end of the bucket, so a snapshot can't outlive its time of day
+                expires = min(now + self.ttl, (bucket + 1) * self.bucket_seconds)
+                for i, real_seconds in zip(missing, durations):
+                    results[i] = (congestion_multiplier(real_seconds, legs[i][2]), expires)
+                    self._cache[keys[i]] = results[i]
+                self._prune(now)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses, "requests": self.requests}
+
+    def _prune(self, now):
+        expired = [key for key, (_, expires) in self._cache.items() if expires <= now]
+        for key in expired:
+            del self._cache[key]
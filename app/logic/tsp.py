@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+
+# Stand-in cost for unreachable pairs, so move deltas stay finite
+UNREACHABLE_SECONDS = 1e9
+
+
+class StopOrderOptimizer:
+    """Orders stops to minimise total travel time over a stops x stops matrix.
+
+    The first stop is always kept as the start. ``return_to_start`` turns the
+    open path into a round trip and ``keep_last`` pins the final stop as the
+    destination. Nearest-neighbour builds the first tour, then 2-opt and
+    Or-opt moves improve it until no move helps or ``time_budget`` runs out.
+    Each move is scored in O(1) from the legs it removes and adds. 2-opt also
+    reverses a run of stops, which changes its cost on asymmetric (one-way)
+    matrices, so prefix sums of the tour's forward and backward leg costs
+    price the reversed run too.
+    """
+
+    def __init__(self, matrix, return_to_start=False, keep_last=False, time_budget=1.0):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        self.matrix = np.where(np.isfinite(matrix), matrix, UNREACHABLE_SECONDS).tolist()
+        self.n = len(matrix)
+        self.return_to_start = return_to_start
+        self.keep_last = keep_last and not return_to_start and self.n > 2
+        self.time_budget = time_budget
+
+    def cost(self, order):
+        m = self.matrix
+        total = sum(m[a][b] for a, b in zip(order, order[1:]))
+        if self.return_to_start and len(order) > 1:
+            total += m[order[-1]][order[0]]
+        return total
+
+    def solve(self):
+        """Best order found, as a list of stop indices starting with 0."""
+        if self.n <= 2:
+            return list(range(self.n))
+
+        deadline = time.perf_counter() + self.time_budget
+        order = self.nearest_neighbor()
+        best = self.cost(order)
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for move in (self._two_opt_pass, self._or_opt_pass):
+                order, new_cost = move(order, best, deadline)
+                if new_cost < best - 1e-9:
+                    best = new_cost
+                    improved = True
+        return order
+
+    def nearest_neighbor(self):
+        m = self.matrix
+        last = self.n - 1 if self.keep_last else None
+        unvisited = set(range(1, self.n)) - {last}
+        order = [0]
+        while unvisited:
+            here = order[-1]
+            nxt = min(unvisited, key=lambda j: m[here][j])
+            order.append(nxt)
+            unvisited.discard(nxt)
+        if last is not None:
+            order.append(last)
+        return order
+
+    def _movable(self):
+        """Positions that may change: everything but the start (and a pinned end)."""
+        return 1, self.n - 1 if self.keep_last else self.n
+
+    def _leg(self, a, b):
+        return 0.0 if b is None else self.matrix[a][b]
+
+    def _after(self, order, k):
+        """Stop following position ``k``: the start again on a round trip, None past the end."""
+        if k + 1 < len(order):
+            return order[k + 1]
+        return order[0] if self.return_to_start else None
+
+    def _prefix_costs(self, order):
+        """Running totals of each leg driven forwards and backwards along ``order``."""
+        m = self.matrix
+        forward, backward = [0.0], [0.0]
+        for a, b in zip(order, order[1:]):
+            forward.append(forward[-1] + m[a][b])
+            backward.append(backward[-1] + m[b][a])
+        return forward, backward
+
+    def _two_opt_pass(self, order, best, deadline):
+        low, high = self._movable()
+        m = self.matrix
+        forward, backward = self._prefix_costs(order)
+        for i in range(low, high - 1):
+            if time.perf_counter() > deadline:
+                break
+            before = order[i - 1]
+            for j in range(i + 1, high):
+                after = self._after(order, j)
+                # Reversing order[i..j]: swap its two boundary legs and drive the run backwards
+                delta = (m[before][order[j]] + self._leg(order[i], after)
+                         - m[before][order[i]] - self._leg(order[j], after)
+                         + (backward[j] - backward[i]) - (forward[j] - forward[i]))
+                if delta < -1e-9:
+                    order = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    best = self.cost(order)
+                    forward, backward = self._prefix_costs(order)
+        return order, best
+
+    def _or_opt_pass(self, order, best, deadline):
+        """Move runs of 1-3 consecutive stops to every other position."""
+        low, high = self._movable()
+        m = self.matrix
+        for length in (1, 2, 3):
+            for i in range(low, high - length + 1):
+                if time.perf_counter() > deadline:
+                    return order, best
+                run = order[i:i + length]
+                rest = order[:i] + order[i + length:]
+                before, after = order[i - 1], self._after(order, i + length - 1)
+                removed = (m[before][run[0]] + self._leg(run[-1], after)
+                           - self._leg(before, after))
+                for j in range(low, high - length + 1):
+                    if j == i:
+                        continue
+                    # Inserted between rest[j - 1] and whatever follows it
+                    a, b = rest[j - 1], self._after(rest, j - 1)
+                    added = m[a][run[0]] + self._leg(run[-1], b) - self._leg(a, b)
+                    if added - removed < -1e-9:
+                        order = rest[:j] + run + rest[j:]
+                        best = self.cost(order)
+                        break
+        return order, best
+
+
+def optimize_order(matrix, return_to_start=False, keep_last=False, time_budget=1.0):
+    """Stop order (indices into ``matrix``) with a short total travel time."""
+    return StopOrderOptimizer(matrix, return_to_start, keep_last, time_budget).solve()
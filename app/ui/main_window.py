@@ -2,17 +2,22 @@
 import tkinter as tk
 import customtkinter as ctk
 import tkintermapview
-import googlemaps
-import osmnx as ox
 import threading
+import time
 from tkinter import messagebox
 from PIL import Image, ImageDraw, ImageTk
 
 # Internal module imports
-from ..logic.routing import RoutingEngine
+from ..logic.cancellation import CancellationToken, RouteCancelled
+from ..logic.geocoding import GeocodingService, create_provider as create_geocoding_provider
+from ..logic.instrumentation import RouteStats, startup
+from ..logic.polyline import SimplifiedPath
 from .widgets import DragDropListbox
 import config
 
+# How often the map zoom is checked so the route can be redrawn at a matching level of detail
+ZOOM_POLL_MS = 250
+
 
 class RouteApp(ctk.CTk):
     def __init__(self):
@@ -20,20 +25,66 @@ class RouteApp(ctk.CTk):
         self.title(config.APP_TITLE)
         self.geometry(config.APP_GEOMETRY)
 
-        # Initialize API and Engine
-        self.gmaps = googlemaps.Client(key=config.GOOGLE_MAPS_API_KEY)
-        self.engine = RoutingEngine()
+        # Initialize API; the routing engine is created on first use (see ``engine``)
+        self.geocoder = GeocodingService(create_geocoding_provider())
+        self._engine = None
+        self._pipeline = None
+        self._engine_lock = threading.Lock()
 
         self.stops = []
         self.markers = []
         self.path_object = None
+        self.route_line = None  # SimplifiedPath of the drawn route
+        self.rendered_zoom = None
+        self.leg_path_objects = []  # Finished legs drawn while the rest of the route computes
+        self.route_token = None  # Cancels the in-flight routing job
         self.dot_markers = []  # Initialize storage for red dots
         self._after_id = None
+        # Bumped per lookup so late answers to superseded queries are dropped
+        self._suggest_seq = 0
+        self._stops_generation = 0
 
         # Track hover state for suggestion list
         self.suggestion_hover_index = None
 
         self._build_ui()
+        self.after(ZOOM_POLL_MS, self.watch_zoom)
+        self._first_paint_binding = self.bind("<Map>", self.on_first_paint, add="+")
+
+    @property
+    def engine(self):
+        """The routing engine, imported and built by whichever background thread needs it first."""
+        with self._engine_lock:
+            if self._engine is None:
+                from ..logic.pipeline import RoutePipeline
+                from ..logic.routing import RoutingEngine
+                self._engine = RoutingEngine()
+                self._pipeline = RoutePipeline(self._engine)
+                startup.mark("engine_ready")
+            return self._engine
+
+    @property
+    def pipeline(self):
+        self.engine
+        return self._pipeline
+
+    def on_first_paint(self, event):
+        if event.widget is not self:
+            return
+        self.unbind("<Map>", self._first_paint_binding)
+        startup.mark("first_paint")
+        if config.WARM_UP_ON_START:
+            # Give Tk a moment to finish drawing before the warm-up competes for the GIL
+            self.after(200, lambda: threading.Thread(target=self.warm_up, daemon=True).start())
+
+    def warm_up(self):
+        try:
+            loaded = self.engine.warm_up((config.DEFAULT_LAT, config.DEFAULT_LNG))
+            startup.mark("warm_up_done")
+            if loaded:
+                print(f"Warmed up {loaded} cached graph(s) near the default position")
+        except Exception as e:
+            print(f"Warm-up skipped: {e}")
 
     def _build_ui(self):
         self.grid_columnconfigure(0, weight=0)
@@ -78,6 +129,29 @@ class RouteApp(ctk.CTk):
         )
         self.route_btn.pack(pady=20, padx=10, fill="x", side="bottom")
 
+        self.optimize_btn = ctk.CTkButton(
+            self.sidebar, text="Optimize Order",
+            fg_color="#3b82f6", hover_color="#2563eb",
+            corner_radius=0,
+            command=self.start_optimize_thread
+        )
+        self.optimize_btn.pack(padx=10, fill="x", side="bottom")
+
+        # A departure time plans the trip offline on the graphs' time-of-day speed profiles
+        self.depart_entry = ctk.CTkEntry(
+            self.sidebar, placeholder_text="Depart at HH:MM (blank: now)",
+            corner_radius=0
+        )
+        self.depart_entry.pack(pady=(10, 10), padx=10, fill="x", side="bottom")
+
+        # Optional per-phase timings of the last route, shown under the status label
+        self.stats_label = ctk.CTkLabel(
+            self.sidebar, text="", text_color="gray",
+            font=("Consolas", 11), justify="left", anchor="w"
+        )
+        if config.SHOW_ROUTE_STATS:
+            self.stats_label.pack(padx=10, fill="x", side="bottom")
+
         self.status_label = ctk.CTkLabel(self.sidebar, text="Status: Ready", text_color="gray")
         self.status_label.pack(pady=(0, 10), side="bottom")
 
@@ -158,6 +232,7 @@ class RouteApp(ctk.CTk):
 
         val = self.search_entry.get()
         if len(val) < 3:
+            self._suggest_seq += 1
             self.hide_suggestions()
             return
 
@@ -165,25 +240,34 @@ class RouteApp(ctk.CTk):
 
     def fetch_suggestions(self):
         query = self.search_entry.get()
-        try:
-            results = self.gmaps.places_autocomplete(query)
-            self.suggestion_list.delete(0, tk.END)
-
-            if results:
-                self.suggestion_container.configure(height=40 * min(len(results), 5))
-                for res in results:
-                    self.suggestion_list.insert(tk.END, res['description'])
-
-                self.suggestion_container.place(
-                    relx=0.5, rely=0.095, anchor="n", relwidth=0.5
-                )
-                self.suggestion_container.lift()
-            else:
-                self.hide_suggestions()
+        self._suggest_seq += 1
+        seq = self._suggest_seq
+        threading.Thread(target=self.lookup_suggestions, args=(query, seq), daemon=True).start()
 
+    def lookup_suggestions(self, query, seq):
+        try:
+            results = self.geocoder.autocomplete(query)
+            self.after(0, lambda: self.show_suggestions(query, seq, results))
         except Exception as e:
             print(f"Autocomplete error: {e}")
 
+    def show_suggestions(self, query, seq, results):
+        if seq != self._suggest_seq or self.search_entry.get() != query:
+            return  # The user kept typing; a newer lookup owns the list
+
+        self.suggestion_list.delete(0, tk.END)
+        if results:
+            self.suggestion_container.configure(height=40 * min(len(results), 5))
+            for description in results:
+                self.suggestion_list.insert(tk.END, description)
+
+            self.suggestion_container.place(
+                relx=0.5, rely=0.095, anchor="n", relwidth=0.5
+            )
+            self.suggestion_container.lift()
+        else:
+            self.hide_suggestions()
+
     def hide_suggestions(self):
         self.suggestion_container.place_forget()
 
@@ -222,35 +306,43 @@ class RouteApp(ctk.CTk):
         addr = self.search_entry.get()
         if not addr:
             return
+        self._suggest_seq += 1
+        self.hide_suggestions()
+        threading.Thread(target=self.geocode_stop, args=(addr, self._stops_generation), daemon=True).start()
+
+    def geocode_stop(self, addr, generation):
         try:
-            geo = self.gmaps.geocode(addr)
-            if geo:
-                loc = geo[0]["geometry"]["location"]
-
-                self.stops.append({
-                    "lat": loc["lat"],
-                    "lng": loc["lng"],
-                    "address": addr[:40]
-                })
-
-                temp_marker = self.map.set_marker(loc["lat"], loc["lng"])
-                self.markers.append(temp_marker)
-                self.map.set_position(loc["lat"], loc["lng"])
-
-                self.refresh_stops_list()
-                self.search_entry.delete(0, tk.END)
-                self.hide_suggestions()
+            location = self.geocoder.geocode(addr)
+            if location:
+                self.after(0, lambda: self.add_stop(addr, location, generation))
         except Exception as e:
-            messagebox.showerror("Error", f"Geocoding failed: {e}")
+            self.after(0, lambda err=str(e): messagebox.showerror("Error", f"Geocoding failed: {err}"))
+
+    def add_stop(self, addr, location, generation):
+        if generation != self._stops_generation:
+            return  # Cleared while geocoding
+        lat, lng = location
+        self.stops.append({
+            "lat": lat,
+            "lng": lng,
+            "address": addr[:40]
+        })
+
+        self.map.set_position(lat, lng)
+
+        self.refresh_stops_list()
+        if self.search_entry.get() == addr:
+            self.search_entry.delete(0, tk.END)
 
     def clear_all(self):
+        self.cancel_route()
+        self._stops_generation += 1
         self.stops = []
         self.stops_box.delete(0, tk.END)
         for m in self.markers:
             m.delete()
-        if self.path_object:
-            self.path_object.delete()
         self.markers = []
+        self.clear_route()
         # Clear dots as well
         for dot in self.dot_markers:
             dot.delete()
@@ -260,63 +352,158 @@ class RouteApp(ctk.CTk):
         if len(self.stops) < 2:
             messagebox.showwarning("Warning", "Please add at least 2 stops.")
             return
-        self.route_btn.configure(state="disabled", text="Calculating...")
-        threading.Thread(target=self.generate_route, daemon=True).start()
-
-    def generate_route(self):
         try:
-            full_route_path = []
-            on_road_stops = []
-
-            for i in range(len(self.stops) - 1):
-                self.after(0, lambda idx=i: self.route_btn.configure(
-                    text=f"Calculating Leg {idx + 1}/{len(self.stops) - 1}..."
-                ))
-
-                start_coords = (self.stops[i]['lat'], self.stops[i]['lng'])
-                end_coords = (self.stops[i + 1]['lat'], self.stops[i + 1]['lng'])
+            depart_at = self.departure_time()
+        except ValueError:
+            messagebox.showwarning("Warning", "Enter the departure time as HH:MM.")
+            return
+        # A new route supersedes the one in flight
+        self.cancel_route()
+        self.clear_route()
+        self.route_token = CancellationToken()
+        self.route_btn.configure(text="Calculating...")
+        stops = [(stop['lat'], stop['lng']) for stop in self.stops]
+        threading.Thread(
+            target=self.generate_route, args=(stops, self.route_token, depart_at), daemon=True
+        ).start()
+
+    def departure_time(self):
+        """Epoch seconds of the next HH:MM typed in, or None to route on live traffic."""
+        text = self.depart_entry.get().strip()
+        if not text:
+            return time.time() if config.SEARCH_MODE == "time_dependent" else None
+        parsed = time.strptime(text, "%H:%M")
+        now = time.localtime()
+        depart_at = time.mktime(now[:3] + (parsed.tm_hour, parsed.tm_min, 0, 0, 0, -1))
+        if depart_at < time.time() - 60:
+            # Already past today: plan for tomorrow
+            depart_at = time.mktime((now.tm_year, now.tm_mon, now.tm_mday + 1,
+                                     parsed.tm_hour, parsed.tm_min, 0, 0, 0, -1))
+        return depart_at
+
+    def cancel_route(self):
+        if self.route_token is not None:
+            self.route_token.cancel()
+            self.route_token = None
+            self.route_btn.configure(state="normal", text="Run A* Pathfinding")
+
+    def generate_route(self, stops, token, depart_at=None):
+        try:
+            total_legs = len(stops) - 1
+            self.after(0, lambda: self.route_btn.configure(text=f"Calculating Leg 1/{total_legs}..."))
+
+            def on_progress(done, total):
+                if done < total and not token.cancelled:
+                    self.after(0, lambda: self.route_btn.configure(
+                        text=f"Calculating Leg {done + 1}/{total}..."
+                    ))
+
+            def on_leg(index, path):
+                # Simplified here, off the UI thread
+                leg_line = SimplifiedPath(path)
+                self.after(0, lambda: self.draw_partial_leg(token, leg_line))
+
+            stats = RouteStats()
+            mode = "time_dependent" if depart_at is not None else None
+            full_route_path, on_road_stops = self.pipeline.route(
+                stops, mode, on_progress=on_progress, stats=stats, on_leg=on_leg, cancel_token=token,
+                depart_at=depart_at
+            )
+            arrive_at = stats.schedule[-1][1] if stats.schedule else None
 
-                # Use engine to get graph
-                graph = self.engine.get_graph_for_segment(start_coords, end_coords)
+            if full_route_path:
+                with stats.phase("simplify"):
+                    route_line = SimplifiedPath(full_route_path)
+                self.after(0, lambda: self.show_route(route_line, on_road_stops, stats, token, arrive_at))
+            else:
+                self.after(0, lambda: messagebox.showerror("Error", "Path calculation failed."))
 
-                # Find the nodes on the actual road network
-                orig_node = ox.distance.nearest_nodes(graph, start_coords[1], start_coords[0])
-                dest_node = ox.distance.nearest_nodes(graph, end_coords[1], end_coords[0])
+        except RouteCancelled:
+            print("Route cancelled")
 
-                snapped_start = self.engine.get_node_coords(graph, orig_node)
-                on_road_stops.append(snapped_start)
+        except Exception as e:
+            print(f"Detailed Error: {e}")
+            if not token.cancelled:
+                self.after(0, lambda err=str(e): messagebox.showerror("Routing Error", err))
 
-                if i == len(self.stops) - 2:
-                    snapped_end = self.engine.get_node_coords(graph, dest_node)
-                    on_road_stops.append(snapped_end)
+        finally:
+            self.after(0, lambda: self.finish_route(token))
 
-                segment_path = self.engine.a_star_algorithm(graph, orig_node, dest_node)
+    def finish_route(self, token):
+        # A newer job owns the button once this one has been superseded
+        if token is self.route_token:
+            self.route_token = None
+            self.route_btn.configure(state="normal", text="Run A* Pathfinding")
 
-                if segment_path:
-                    full_route_path.extend(segment_path)
-                else:
-                    raise Exception(f"Could not find path between Stop {i + 1} and Stop {i + 2}")
+    def draw_partial_leg(self, token, leg_line):
+        if token is not self.route_token or token.cancelled or len(leg_line.path) < 2:
+            return
+        self.leg_path_objects.append(self.map.set_path(leg_line.for_zoom(self.map.zoom), color="#93c5fd", width=4))
 
-            if full_route_path:
-                self.after(0, lambda: self.draw_path(full_route_path, on_road_stops))
-            else:
-                self.after(0, lambda: messagebox.showerror("Error", "Path calculation failed."))
+    def start_optimize_thread(self):
+        if len(self.stops) < 3:
+            messagebox.showwarning("Warning", "Please add at least 3 stops to optimize.")
+            return
+        self.optimize_btn.configure(state="disabled", text="Optimizing...")
+        threading.Thread(target=self.optimize_order, daemon=True).start()
 
+    def optimize_order(self):
+        # The first stop stays the starting point; the rest are reordered
+        stops = list(self.stops)
+        try:
+            order = self.engine.optimize_stop_order([(stop['lat'], stop['lng']) for stop in stops])
+            self.after(0, lambda: self.apply_stop_order(stops, order))
         except Exception as e:
             print(f"Detailed Error: {e}")
-            self.after(0, lambda err=str(e): messagebox.showerror("Routing Error", err))
-
+            self.after(0, lambda err=str(e): messagebox.showerror("Optimize Error", err))
         finally:
-            self.after(0, lambda: self.route_btn.configure(state="normal", text="Run A* Pathfinding"))
+            self.after(0, lambda: self.optimize_btn.configure(state="normal", text="Optimize Order"))
+
+    def apply_stop_order(self, stops, order):
+        if self.stops != stops:
+            return  # Stops were edited while optimizing; keep the user's changes
+        self.cancel_route()
+        self.stops = [stops[i] for i in order]
+        self.refresh_stops_list()
+        self.clear_route()
 
-    def draw_path(self, path, on_road_stops):
+    def clear_route(self):
+        for leg_path in self.leg_path_objects:
+            leg_path.delete()
+        self.leg_path_objects = []
+        self.route_line = None
+        if self.path_object:
+            self.path_object.delete()
+            self.path_object = None
+            for dot in self.dot_markers:
+                dot.delete()
+            self.dot_markers = []
+
+    def show_route(self, route_line, on_road_stops, stats, token, arrive_at=None):
+        if token is not self.route_token or token.cancelled:
+            return  # Stops changed (or a newer route started) while this one computed
+        for leg_path in self.leg_path_objects:
+            leg_path.delete()
+        self.leg_path_objects = []
+        with stats.phase("render"):
+            self.draw_path(route_line, on_road_stops)
+        startup.mark("first_route")
+        if arrive_at is not None:
+            self.status_label.configure(text=f"Status: Arrive {time.strftime('%H:%M', time.localtime(arrive_at))}")
+        else:
+            self.status_label.configure(text="Status: Ready")
+        if config.SHOW_ROUTE_STATS:
+            self.stats_label.configure(text="\n".join(stats.summary_lines()[:8]))
+
+    def draw_path(self, route_line, on_road_stops):
         for m in self.markers:
             m.delete()
         self.markers = []
 
-        if self.path_object:
-            self.path_object.delete()
-        self.path_object = self.map.set_path(path, color="#3b82f6", width=5)
+        self.route_line = route_line
+        lats, lngs = zip(*route_line.path)
+        self.map.fit_bounding_box((max(lats), min(lngs)), (min(lats), max(lngs)))
+        self.render_route_line()
 
         for dot in self.dot_markers:
             dot.delete()
@@ -337,28 +524,49 @@ class RouteApp(ctk.CTk):
             )
             self.dot_markers.append(dot)
 
-        lats, lngs = zip(*path)
-        self.map.fit_bounding_box((max(lats), min(lngs)), (min(lats), max(lngs)))
+    def render_route_line(self):
+        """(Re)draw the route with only the detail visible at the current zoom."""
+        if self.path_object:
+            self.path_object.delete()
+        self.rendered_zoom = round(self.map.zoom)
+        self.path_object = self.map.set_path(self.route_line.for_zoom(self.rendered_zoom), color="#3b82f6", width=5)
+
+    def watch_zoom(self):
+        if self.route_line is not None and round(self.map.zoom) != self.rendered_zoom:
+            self.render_route_line()
+        self.after(ZOOM_POLL_MS, self.watch_zoom)
 
     def handle_reorder(self, old_index, new_index):
+        self.cancel_route()
         item = self.stops.pop(old_index)
         self.stops.insert(new_index, item)
 
-        marker = self.markers.pop(old_index)
-        self.markers.insert(new_index, marker)
+        # Markers follow their stop, so refresh_stops_list only renumbers them
+        if old_index < len(self.markers):
+            marker = self.markers.pop(old_index)
+            self.markers.insert(new_index, marker)
 
         self.refresh_stops_list()
 
     def refresh_stops_list(self):
-        self.stops_box.delete(0, tk.END)
-        for m in self.markers:
-            m.delete()
-        self.markers = []
-
+        """Bring the sidebar rows and stop markers in line with ``self.stops``, touching only what changed."""
         for i, stop in enumerate(self.stops):
             stop_number = str(i + 1)
             addr_text = stop.get('address', f"Stop at {stop['lat']:.4f}...")
-            self.stops_box.insert(tk.END, f"{stop_number}. {addr_text}")
+            row_text = f"{stop_number}. {addr_text}"
+            if i >= self.stops_box.size():
+                self.stops_box.insert(tk.END, row_text)
+            elif self.stops_box.get(i) != row_text:
+                self.stops_box.delete(i)
+                self.stops_box.insert(i, row_text)
+
+            marker = self.markers[i] if i < len(self.markers) else None
+            if marker is not None and tuple(marker.position) == (stop['lat'], stop['lng']):
+                if marker.text != stop_number:
+                    marker.set_text(stop_number)
+                continue
+            if marker is not None:
+                marker.delete()
 
             new_marker = self.map.set_marker(
                 stop['lat'],
@@ -367,7 +575,17 @@ class RouteApp(ctk.CTk):
                 marker_color_circle="#ef4444",
                 marker_color_outside="#991b1b"
             )
-            self.markers.append(new_marker)
+            if marker is not None:
+                self.markers[i] = new_marker
+            else:
+                self.markers.append(new_marker)
+
+        # Rows and markers of stops that no longer exist
+        if self.stops_box.size() > len(self.stops):
+            self.stops_box.delete(len(self.stops), tk.END)
+        for m in self.markers[len(self.stops):]:
+            m.delete()
+        del self.markers[len(self.stops):]
 
     def get_red_dot_icon(self):
         size = 16
@@ -377,17 +595,12 @@ class RouteApp(ctk.CTk):
         return ImageTk.PhotoImage(image)
 
     def handle_delete(self, index):
+        self.cancel_route()
         self.stops.pop(index)
-        marker_to_remove = self.markers.pop(index)
-        marker_to_remove.delete()
+        if index < len(self.markers):
+            self.markers.pop(index).delete()
         self.refresh_stops_list()
-
-        if self.path_object:
-            self.path_object.delete()
-            self.path_object = None
-            for dot in self.dot_markers:
-                dot.delete()
-            self.dot_markers = []
+        self.clear_route()
 
     def on_search_enter(self, event):
         self.search_container.configure(border_color="#3b82f6")
@@ -0,0 +1,216 @@
+# batch.py
+"""Headless batch routing: JSONL route requests in, JSONL results out.
+
+    python batch.py jobs.jsonl -o results.jsonl [--workers 4] [--unordered]
+    cat jobs.jsonl | python batch.py > results.jsonl
+
+Each input line is one job::
+
+    {"id": "trip-1", "stops": [[21.0285, 105.8542], "Hoan Kiem Lake, Hanoi", {"lat": 21.03, "lng": 105.85}]}
+
+``stops`` may mix ``[lat, lon]`` pairs, ``{"lat", "lng"}`` objects and address
+strings (geocoded through the cached geocoder, ``config.GEOCODER_PROVIDER``). ``mode`` optionally overrides
+``config.SEARCH_MODE``. Each output line is ``{"id", "ok", "path", "stops"}``
+or ``{"id", "ok": false, "error"}``.
+
+Jobs are read lazily and at most ``--window`` of them are in flight or waiting
+to be written at any time, so memory stays flat however large the input is.
+Every worker process keeps its own RoutingEngine, so graphs loaded for one job
+are reused by the next. Log output goes to stderr to keep stdout valid JSONL.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import config
+
+# One routing pipeline (and engine) per worker, created on its first job
+_worker_pipeline = None
+_geocoder = None
+
+
+def _init_worker(overrides):
+    # Workers share the parent's stdout; keep their prints out of the JSONL stream
+    sys.stdout = sys.stderr
+    # Spawned workers re-import config, so command-line overrides are re-applied here
+    for name, value in overrides.items():
+        setattr(config, name, value)
+
+
+def _get_pipeline():
+    global _worker_pipeline
+    if _worker_pipeline is None:
+        from app.logic.pipeline import RoutePipeline
+        from app.logic.routing import RoutingEngine
+        _worker_pipeline = RoutePipeline(RoutingEngine(), workers=1)
+    return _worker_pipeline
+
+
+def _geocode(address):
+    global _geocoder
+    if _geocoder is None:
+        from app.logic.geocoding import GeocodingService, create_provider
+        _geocoder = GeocodingService(create_provider())
+    location = _geocoder.geocode(address)
+    if location is None:
+        raise ValueError(f"Address not found: {address}")
+    return location
+
+
+def parse_stop(stop):
+    """``(lat, lon)`` from a ``[lat, lon]`` pair, a ``{"lat", "lng"}`` object or an address."""
+    if isinstance(stop, str):
+        return _geocode(stop)
+    if isinstance(stop, dict):
+        return float(stop["lat"]), float(stop.get("lng", stop.get("lon")))
+    lat, lon = stop
+    return float(lat), float(lon)
+
+
+def route_job(job, include_stats=False):
+    """Route one parsed job; always returns a result dict, never raises."""
+    result = {"id": job.get("id")}
+    try:
+        stops = [parse_stop(stop) for stop in job["stops"]]
+        if len(stops) < 2:
+            raise ValueError("A job needs at least 2 stops")
+        pipeline = _get_pipeline()
+        path, on_road_stops = pipeline.route(stops, mode=job.get("mode"))
+        result.update(ok=True, path=path, stops=on_road_stops)
+        if include_stats:
+            stats = pipeline.last_stats.as_dict()
+            result["stats"] = {"timings_ms": stats["timings_ms"], "counters": stats["counters"]}
+    except Exception as e:
+        result.update(ok=False, error=str(e))
+    return result
+
+
+def read_jobs(lines):
+    """Parsed jobs from JSONL lines, lazily; blank lines are skipped and ids default to the line number."""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            job = {"stops": [], "_error": f"Invalid JSON on line {number}: {e}"}
+        if isinstance(job, list):
+            job = {"stops": job}
+        elif not isinstance(job, dict):
+            job = {"stops": [], "_error": f"Line {number} is not a job object or stop list: {line[:80]}"}
+        job.setdefault("id", number)
+        yield job
+
+
+def run_batch(jobs, write, workers=None, ordered=True, window=None, include_stats=False, overrides=None):
+    """Route ``jobs`` and ``write(result)`` each one; returns ``(succeeded, failed)``.
+
+    Keeps at most ``window`` jobs between submission and output. In ordered
+    mode a finished job waits for the ones submitted before it. ``overrides``
+    are config attributes to set in every worker.
+    """
+    workers = config.ROUTING_WORKERS if workers is None else workers
+    window = window or max(2, workers * 4)
+    overrides = overrides or {}
+    if workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(overrides,)
+        )
+    else:
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    pending = {}
+    finished = {}
+    next_to_write = 0
+    counts = [0, 0]
+
+    def emit(result):
+        counts[0 if result.get("ok") else 1] += 1
+        write(result)
+
+    def collect():
+        nonlocal next_to_write
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            seq = pending.pop(future)
+            if ordered:
+                finished[seq] = future.result()
+            else:
+                emit(future.result())
+        while next_to_write in finished:
+            emit(finished.pop(next_to_write))
+            next_to_write += 1
+
+    with executor:
+        for seq, job in enumerate(jobs):
+            if "_error" in job:
+                future = executor.submit(_failed, job)
+            else:
+                future = executor.submit(route_job, job, include_stats)
+            pending[future] = seq
+            while len(pending) + len(finished) >= window:
+                collect()
+        while pending:
+            collect()
+    return tuple(counts)
+
+
+def _failed(job):
+    return {"id": job["id"], "ok": False, "error": job["_error"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route JSONL jobs without the GUI.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of jobs, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file, '-' for stdout")
+    parser.add_argument("--workers", type=int, default=config.ROUTING_WORKERS,
+                        help="routing processes; 1 routes on the main process")
+    parser.add_argument("--unordered", action="store_true",
+                        help="write results as they finish instead of in input order")
+    parser.add_argument("--window", type=int, help="max jobs in flight or awaiting output (default 4 x workers)")
+    parser.add_argument("--stats", action="store_true", help="include per-job phase timings and search counters")
+    parser.add_argument("--traffic", choices=("google", "file", "static"),
+                        help="traffic provider, e.g. 'static' to run offline (default config.TRAFFIC_PROVIDER)")
+    parser.add_argument("--geocoder", choices=("google", "offline"),
+                        help="geocoding provider for address stops (default config.GEOCODER_PROVIDER)")
+    parser.add_argument("--mode", help="search mode for jobs that don't set one (default config.SEARCH_MODE)")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.traffic:
+        overrides["TRAFFIC_PROVIDER"] = args.traffic
+    if args.mode:
+        overrides["SEARCH_MODE"] = args.mode
+    if args.geocoder:
+        overrides["GEOCODER_PROVIDER"] = args.geocoder
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    owns_sink = sink is not sys.stdout
+    # Everything printed from here on is a log line, not a result
+    sys.stdout = sys.stderr
+
+    def write(result):
+        sink.write(json.dumps(result) + "\n")
+        sink.flush()
+
+    try:
+        succeeded, failed = run_batch(
+            read_jobs(source), write, args.workers, not args.unordered, args.window, args.stats, overrides
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if owns_sink:
+            sink.close()
+    print(f"Routed {succeeded} jobs, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Micro-benchmark: cost of one heuristic evaluation inside the A* relaxation loop.
+
+    python -m benchmarks.bench_heuristic [--side 200] [--queries 20]
+
+"before" is what a_star_algorithm did per relaxation: read node coordinates
+from the networkx attribute dicts and build a geopy ``great_circle``. "after"
+is one vectorised pass over the node arrays per query plus a list lookup per
+relaxation.
+"""
+import argparse
+import time
+
+from geopy.distance import great_circle
+
+from app.logic.geo import travel_time_bound
+from app.logic.search import a_star
+from benchmarks.synthetic import grid_graph, random_queries
+
+
+def per_call_seconds(fn, args, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for a in args:
+            fn(a)
+    return (time.perf_counter() - started) / (repeat * len(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--side", type=int, default=200, help="grid side length in nodes")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    graph = grid_graph(args.side, seed=args.seed)
+    nodes = {i: {"y": y, "x": x} for i, (y, x) in enumerate(zip(graph.lat.tolist(), graph.lon.tolist()))}
+    target = graph.num_nodes - 1
+    target_coords = graph.coords(target)
+    sample = list(range(0, graph.num_nodes, max(1, graph.num_nodes // 5000)))
+
+    def before(i):
+        return great_circle((nodes[i]["y"], nodes[i]["x"]), target_coords).meters / 28.0
+
+    started = time.perf_counter()
+    estimates = travel_time_bound(graph, target).tolist()
+    build = time.perf_counter() - started
+
+    print(f"graph: {graph.num_nodes} nodes, {graph.num_edges} edges")
+    print(f"per evaluation  before: {per_call_seconds(before, sample, 3) * 1e6:8.3f} us")
+    print(f"per evaluation  after:  {per_call_seconds(estimates.__getitem__, sample, 3) * 1e6:8.3f} us"
+          f"  (+ {build * 1e3:.2f} ms per query for the array)")
+
+    totals = {"before": 0.0, "after": 0.0}
+    for source, target in random_queries(graph, args.queries, seed=args.seed):
+        target_coords = graph.coords(target)
+
+        started = time.perf_counter()
+        a_star(graph, source, target,
+               lambda i: great_circle((nodes[i]["y"], nodes[i]["x"]), target_coords).meters / 28.0)
+        totals["before"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        a_star(graph, source, target, travel_time_bound(graph, target).tolist().__getitem__)
+        totals["after"] += time.perf_counter() - started
+
+    for name, total in totals.items():
+        print(f"A* query mean   {name + ':':7} {total / args.queries * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
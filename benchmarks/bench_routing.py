@@ -0,0 +1,248 @@
+"""Routing benchmark suite: query latency, search effort, load time and memory per search mode.
+
+    python -m benchmarks.bench_routing [--quick] [--modes a_star,alt] [--output results.json]
+    python -m benchmarks.bench_routing --compare baseline.json [--output results.json]
+
+Runs entirely offline on synthetic grid and random-geometric graphs at several
+sizes, plus any ``.rgraph`` / ``.graphml`` graphs already in ``cache/``. Queries
+and graphs come from fixed seeds, so two runs on the same tree measure the same
+work. Preprocessed CH / ALT data is built in a scratch directory, never in ``cache/``.
+
+Peak RSS is the process high-water mark when each row finishes, so it only
+grows down the table; compare it between runs, not between rows.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Unix only; peak RSS is reported as None elsewhere
+    resource = None
+
+import numpy as np
+
+import config
+from app.logic.compiled_graph import CompiledGraph
+from app.logic.graph_store import GRAPH_EXTENSION, load_graph
+from benchmarks.synthetic import grid_graph, random_geometric_graph, random_queries
+
+MODES = ("a_star", "bidirectional", "alt", "ch")
+
+SYNTHETIC_SIZES = {
+    "grid": (50, 100, 200),
+    "geometric": (2000, 10000, 40000),
+}
+QUICK_SIZES = {
+    "grid": (50,),
+    "geometric": (2000,),
+}
+
+# Hierarchies take minutes beyond this; skip CH rather than stall the suite
+CH_MAX_NODES = 20000
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1e3) if samples else None
+
+
+def synthetic_graphs(sizes, seed):
+    """``(name, loader)`` pairs; loaders return ``(graph, load_seconds)``."""
+    for side in sizes["grid"]:
+        yield f"grid_{side}x{side}", lambda side=side: _timed(lambda: grid_graph(side, seed=seed))
+    for count in sizes["geometric"]:
+        yield f"geometric_{count}", lambda count=count: _timed(lambda: random_geometric_graph(count, seed=seed))
+
+
+def cached_graphs(cache_dir):
+    """Graphs already on disk: binary caches as-is, GraphML compiled the way the engine migrates it."""
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*" + GRAPH_EXTENSION))):
+        name = os.path.basename(path)
+        yield name, lambda path=path: _timed(lambda: load_graph(path)[0])
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*.graphml"))):
+        name = os.path.basename(path)
+        yield name, lambda path=path: _timed(lambda: _load_graphml(path))
+
+
+def _load_graphml(path):
+    import osmnx as ox
+    nx_graph = ox.load_graphml(path)
+    nx_graph = ox.add_edge_speeds(nx_graph)
+    nx_graph = ox.add_edge_travel_times(nx_graph)
+    return CompiledGraph.from_networkx(nx_graph)
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def bench_mode(engine, graph, mode, queries, warmup):
+    """Latency percentiles and mean nodes expanded for one graph and search mode."""
+    preprocess_seconds = None
+    if mode in ("alt", "ch"):
+        started = time.perf_counter()
+        engine.get_preprocessed(graph, mode, build=True)
+        preprocess_seconds = time.perf_counter() - started
+
+    # Untimed query so one-off lazy setup (CH adjacency lists, reverse graphs) stays out of p99
+    for source, target in warmup:
+        engine.find_path(graph, source, target, mode)
+
+    latencies, expanded, found = [], [], 0
+    for source, target in queries:
+        engine.last_search_stats = {}
+        started = time.perf_counter()
+        path = engine.find_path(graph, source, target, mode)
+        latencies.append(time.perf_counter() - started)
+        if path:
+            found += 1
+        if "nodes_expanded" in engine.last_search_stats:
+            expanded.append(engine.last_search_stats["nodes_expanded"])
+
+    return {
+        "queries": len(queries),
+        "paths_found": found,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "mean_ms": float(np.mean(latencies) * 1e3) if latencies else None,
+        "nodes_expanded_mean": float(np.mean(expanded)) if expanded else None,
+        "preprocess_s": preprocess_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run(args):
+    from app.logic.routing import RoutingEngine
+
+    # Offline: traffic never leaves the process, preprocessing stays out of cache/
+    config.TRAFFIC_PROVIDER = "static"
+    cache_dir = config.CACHE_DIR
+    scratch = tempfile.mkdtemp(prefix="route_bench_")
+    config.CACHE_DIR = scratch
+    engine = RoutingEngine()
+
+    modes = args.modes.split(",") if args.modes else list(MODES)
+    sources = list(synthetic_graphs(QUICK_SIZES if args.quick else SYNTHETIC_SIZES, args.seed))
+    if not args.no_cached:
+        sources += list(cached_graphs(cache_dir))
+
+    results = {
+        "meta": {
+            "seed": args.seed,
+            "queries": args.queries,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "graphs": {},
+    }
+
+    try:
+        for name, loader in sources:
+            entry = bench_graph(engine, name, loader, modes, args)
+            if entry is not None:
+                results["graphs"][name] = entry
+    finally:
+        config.CACHE_DIR = cache_dir
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def bench_graph(engine, name, loader, modes, args):
+    """Every mode on one graph; ``load_s`` is generation time for synthetic graphs."""
+    graph, load_seconds = loader()
+    if graph.num_nodes == 0:
+        return None
+    queries = random_queries(graph, args.queries, seed=args.seed)
+    warmup = random_queries(graph, 1, seed=args.seed + 1)
+    entry = {
+        "nodes": graph.num_nodes,
+        "edges": graph.num_edges,
+        "load_s": load_seconds,
+        "bytes": graph.nbytes,
+        "modes": {},
+    }
+    for mode in modes:
+        if mode == "ch" and graph.num_nodes > CH_MAX_NODES:
+            continue
+        entry["modes"][mode] = bench_mode(engine, graph, mode, queries, warmup)
+        _print_row(name, graph, mode, entry)
+    return entry
+
+
+def _print_row(name, graph, mode, entry):
+    r = entry["modes"][mode]
+    expanded = f"{r['nodes_expanded_mean']:9.0f}" if r["nodes_expanded_mean"] is not None else "        -"
+    rss = f"{r['peak_rss_mb']:7.1f}" if r["peak_rss_mb"] is not None else "      -"
+    print(f"{name:24} {graph.num_nodes:7d} {mode:14} "
+          f"p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms  "
+          f"expanded {expanded}  load {entry['load_s'] * 1e3:8.1f} ms  rss {rss} MB")
+
+
+def compare(baseline, current):
+    """Print p50/p95 and nodes-expanded changes for every (graph, mode) present in both runs."""
+    print(f"\n{'graph':24} {'mode':14} {'p50 ms':>20} {'p95 ms':>20} {'expanded':>18}")
+    for name, entry in current["graphs"].items():
+        old_entry = baseline["graphs"].get(name)
+        if old_entry is None:
+            continue
+        for mode, new in entry["modes"].items():
+            old = old_entry["modes"].get(mode)
+            if old is None:
+                continue
+            print(f"{name:24} {mode:14} "
+                  f"{_delta(old['p50_ms'], new['p50_ms']):>20} "
+                  f"{_delta(old['p95_ms'], new['p95_ms']):>20} "
+                  f"{_delta(old['nodes_expanded_mean'], new['nodes_expanded_mean'], 0):>18}")
+
+
+def _delta(old, new, digits=2):
+    if old is None or new is None:
+        return "-"
+    change = (new - old) / old * 100 if old else 0.0
+    return f"{new:.{digits}f} ({change:+.0f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=50, help="queries per graph")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", help=f"comma-separated subset of {','.join(MODES)}")
+    parser.add_argument("--quick", action="store_true", help="smallest synthetic graphs only")
+    parser.add_argument("--no-cached", action="store_true", help="skip graphs found in cache/")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
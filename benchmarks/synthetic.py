@@ -0,0 +1,66 @@
+import numpy as np
+
+import config
+from app.logic.compiled_graph import CompiledGraph
+from app.logic.geo import METERS_PER_DEGREE, haversine_array
+
+# Free-flow speeds (m/s) drawn for synthetic roads: residential, secondary, primary
+ROAD_SPEEDS = np.array([8.3, 13.9, 22.2])
+
+
+def grid_graph(side, spacing_deg=0.001, drop=0.1, seed=0, origin=(config.DEFAULT_LAT, config.DEFAULT_LNG)):
+    """``side x side`` street grid with two-way roads; ``drop`` of the segments are removed."""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lat = origin[0] + rows * spacing_deg
+    lon = origin[1] + cols * spacing_deg
+
+    ids = np.arange(side * side).reshape(side, side)
+    horizontal = np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1)
+    vertical = np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1)
+    segments = np.vstack([horizontal, vertical])
+    segments = segments[rng.random(len(segments)) >= drop]
+    return _two_way_graph(lat, lon, segments, rng)
+
+
+def random_geometric_graph(num_nodes, connect_m=250.0, seed=0, origin=(config.DEFAULT_LAT, config.DEFAULT_LNG)):
+    """Nodes scattered uniformly over a square, joined when closer than ``connect_m``."""
+    rng = np.random.default_rng(seed)
+    # Square sized for roughly six neighbours per node on average
+    side_m = connect_m * np.sqrt(num_nodes * np.pi / 6)
+    lat = origin[0] + rng.random(num_nodes) * side_m / METERS_PER_DEGREE
+    lon = origin[1] + rng.random(num_nodes) * side_m / (METERS_PER_DEGREE * np.cos(np.radians(origin[0])))
+
+    # Bucket nodes into connect_m cells so only neighbouring cells are compared
+    cell = np.floor(np.stack([lat, lon], axis=1) * METERS_PER_DEGREE / connect_m).astype(np.int64)
+    buckets = {}
+    for i, key in enumerate(map(tuple, cell.tolist())):
+        buckets.setdefault(key, []).append(i)
+
+    segments = []
+    for (row, col), members in buckets.items():
+        candidates = [j for dr in (-1, 0, 1) for dc in (-1, 0, 1) for j in buckets.get((row + dr, col + dc), ())]
+        candidates = np.asarray(candidates)
+        for i in members:
+            others = candidates[candidates > i]
+            close = others[haversine_array(lat[i], lon[i], lat[others], lon[others]) < connect_m]
+            segments.extend((i, j) for j in close.tolist())
+
+    return _two_way_graph(lat, lon, np.asarray(segments, dtype=np.int64).reshape(-1, 2), rng)
+
+
+def _two_way_graph(lat, lon, segments, rng):
+    length = haversine_array(lat[segments[:, 0]], lon[segments[:, 0]], lat[segments[:, 1]], lon[segments[:, 1]])
+    travel_time = length / ROAD_SPEEDS[rng.integers(0, len(ROAD_SPEEDS), len(segments))]
+
+    src = np.concatenate([segments[:, 0], segments[:, 1]])
+    dst = np.concatenate([segments[:, 1], segments[:, 0]])
+    return CompiledGraph.from_edges(
+        np.arange(len(lat), dtype=np.int64), lat, lon, src, dst, np.concatenate([travel_time, travel_time])
+    )
+
+
+def random_queries(graph, count, seed=0):
+    """``count`` reproducible ``(source, target)`` node-index pairs."""
+    rng = np.random.default_rng(seed)
+    return [tuple(pair) for pair in rng.integers(0, graph.num_nodes, size=(count, 2)).tolist()]
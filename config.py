@@ -4,11 +4,54 @@ import os
 CACHE_DIR = os.path.join(os.getcwd(), "cache")
 GOOGLE_MAPS_API_KEY = ""
 
+# Routing Settings
+GRAPH_MEMORY_BUDGET_MB = 512  # In-memory graph cache size before LRU eviction
+USE_GRAPH_TILES = True  # Stitch legs from cached tiles instead of one download per leg
+GRAPH_TILE_SIZE_DEG = 0.02  # ~2.2 km tiles
+TILE_CORRIDOR_BUFFER_M = 1500  # Minimum road buffer kept around each leg
+SEARCH_MODE = "a_star"  # "a_star", "bidirectional", "alt" (landmark heuristic), "ch" (contraction hierarchies) or "time_dependent" (speed profiles, by departure time)
+BUILD_CH_ON_DEMAND = False  # Preprocess a hierarchy the first time "ch" mode meets a graph
+BUILD_LANDMARKS_ON_DEMAND = True  # Landmark tables are cheap enough to build on first use
+ALT_LANDMARK_COUNT = 16
+ROUTING_WORKERS = 4  # Search processes for multi-leg routes; 1 searches on the routing thread
+INLINE_SEARCH_MAX_NODES = 5000  # Legs on smaller graphs search on the routing thread; handing them off costs more
+GRAPH_FETCH_WORKERS = 2  # Threads fetching upcoming legs' graphs while earlier legs search
+LOG_ROUTE_STATS = True  # Print one JSON line of phase timings and search counters per route
+STOP_ORDER_TIME_BUDGET = 2.0  # Seconds "Optimize Order" may spend improving the stop order
+LEG_CACHE_SIZE = 512  # Searched legs kept so re-routing after a reorder, delete or add skips unchanged legs
+WARM_UP_ON_START = True  # Load cached graphs near DEFAULT_LAT/LNG in the background at startup
+WARMUP_RADIUS_M = 5000
+WARMUP_MAX_GRAPHS = 4  # Point-radius graphs loaded by the warm-up, most recently written first
+CACHE_DISK_BUDGET_MB = 2048  # Graphs, tiles and preprocessing files kept in CACHE_DIR before LRU eviction (imported extracts are pinned and not counted)
+OSMNX_CACHE_MAX_AGE_HOURS = 24  # osmnx HTTP responses (and crash leftovers) in CACHE_DIR older than this are deleted
+ALLOW_DOWNLOADS = True  # False: route on cached graphs and tiles only, failing legs that need a download
+
+# Traffic Settings
+TRAFFIC_PROVIDER = "google"  # "google", "file" (TRAFFIC_FILE snapshot) or "static" (fixed ratio, offline)
+TRAFFIC_FILE = "traffic.json"
+TRAFFIC_STATIC_RATIO = 1.0
+TRAFFIC_TTL_SECONDS = 600  # How long a fetched multiplier is reused
+TRAFFIC_BUCKET_SECONDS = 900  # Multipliers never carry over into the next 15-minute bucket
+SPEED_PROFILE_FILE = "speed_profiles.json"  # Time-of-day multipliers saved with newly compiled graphs; built-in rush-hour profile if missing
+
+# Geocoding Settings
+GEOCODER_PROVIDER = "google"  # "google" or "offline" (GEOCODER_FILE gazetteer)
+GEOCODER_FILE = "places.json"
+GEOCODE_STORE = "geocode.json"  # Geocoded addresses kept in CACHE_DIR across runs
+GEOCODE_MEMORY_SIZE = 512  # Addresses and autocomplete queries kept in memory
+
+# Service Settings
+SERVICE_HOST = "127.0.0.1"  # Local only; the service has no authentication
+SERVICE_PORT = 8765
+SERVICE_THREADS = 4  # Routes handled at once; their searches share the ROUTING_WORKERS pool
+
 # App Settings
 APP_TITLE = "A* Route Planner"
 APP_GEOMETRY = "1200x800"
 APPEARANCE_MODE = "Dark"
 COLOR_THEME = "blue"
+SHOW_ROUTE_STATS = False  # Per-phase timings panel under the status label
+STARTUP_TIMING = False  # Print time to first paint, engine ready and first route (or run main.py --startup-timing)
 
 # Map Settings
 DEFAULT_LAT = 21.0285
@@ -0,0 +1,45 @@
+# import_osm.py
+"""Offline import of a local OpenStreetMap extract into the routing cache.
+
+    python import_osm.py hanoi.osm.pbf
+    python import_osm.py extract.osm --bbox 20.95,105.75,21.10,105.95 --region-graph
+
+Reads ``.osm`` XML (optionally ``.gz`` / ``.bz2``) or ``.osm.pbf`` (needs
+pyosmium) and writes every cache tile inside the extract's bounds (or
+``--bbox south,west,north,east``), so any leg in the region is routed without
+a download, e.g. on hosts with ``config.ALLOW_DOWNLOADS = False``.
+``--region-graph`` also writes the whole region as one point-radius graph for
+``USE_GRAPH_TILES = False``; it is on by default in that configuration.
+"""
+import argparse
+import os
+
+import config
+from app.logic.cache_manager import CacheManager
+from app.logic.osm_import import OsmImporter
+from app.logic.tiles import TileStore
+
+
+def parse_bbox(text):
+    south, west, north, east = (float(value) for value in text.split(","))
+    if south >= north or west >= east:
+        raise argparse.ArgumentTypeError("expected south,west,north,east")
+    return south, west, north, east
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a local OSM extract into the routing cache.")
+    parser.add_argument("extract", help=".osm, .osm.gz, .osm.bz2 or .osm.pbf file")
+    parser.add_argument("--bbox", type=parse_bbox, help="south,west,north,east to import (default: extract bounds)")
+    parser.add_argument("--region-graph", action="store_true", default=not config.USE_GRAPH_TILES,
+                        help="also write the region as one point-radius graph")
+    args = parser.parse_args()
+
+    disk_cache = CacheManager(config.CACHE_DIR, config.CACHE_DISK_BUDGET_MB * 1024 * 1024,
+                              config.OSMNX_CACHE_MAX_AGE_HOURS * 3600)
+    tile_store = TileStore(os.path.join(config.CACHE_DIR, "tiles"), config.GRAPH_TILE_SIZE_DEG, disk_cache)
+    OsmImporter(args.extract, tile_store, args.bbox).run(args.region_graph)
+
+
+if __name__ == "__main__":
+    main()
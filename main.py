@@ -1,13 +1,22 @@
 # main.py
+import sys
+
+# First, so the startup clock also covers the imports below
+from app.logic.instrumentation import startup
+
 import customtkinter as ctk
 import config
 from app.ui.main_window import RouteApp
 
 if __name__ == "__main__":
+    startup.enabled = config.STARTUP_TIMING or "--startup-timing" in sys.argv
+    startup.mark("imports")
+
     # Apply global configurations
     ctk.set_appearance_mode(config.APPEARANCE_MODE)
     ctk.set_default_color_theme(config.COLOR_THEME)
 
     # Initialize and run the application
     app = RouteApp()
-    app.mainloop()
\ No newline at end of file
+    startup.mark("window_created")
+    app.mainloop()
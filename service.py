@@ -0,0 +1,235 @@
+# service.py
+"""Local HTTP routing service that keeps graphs loaded between requests.
+
+    python service.py [--host 127.0.0.1] [--port 8765] [--offline]
+
+Endpoints (JSON in and out):
+
+    POST /route    {"stops": [[lat, lon], ...], "mode": "alt"}
+                   -> {"path": [[lat, lon], ...], "stops": [...], "stats": {...}}
+    GET  /health   -> {"status": "ok", "uptime_s": ..., "in_flight": ...}
+    GET  /metrics  -> request counters, latency percentiles, graph and traffic cache stats
+
+One RoutingEngine lives for the whole process, so its in-memory graph cache,
+preprocessed CH / ALT data and traffic cache stay warm across requests. The
+asyncio loop only parses and answers HTTP: routes run on a small thread pool
+and their searches on the pipeline's process pool. Concurrent requests for
+the same stops and mode share one computation.
+
+``--offline`` uses the static traffic provider and never downloads, so
+requests are answered from ``cache/`` alone.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+
+MAX_BODY_BYTES = 1024 * 1024
+LATENCY_WINDOW = 1000
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RoutingService:
+    """Route requests over one shared engine; see the module docstring for the endpoints."""
+
+    def __init__(self, threads=None, workers=None):
+        from app.logic.pipeline import RoutePipeline
+        from app.logic.routing import RoutingEngine
+
+        self.engine = RoutingEngine()
+        self.pipeline = RoutePipeline(self.engine, workers=workers)
+        # Inline searches (small, time-dependent or worker-less legs) keep their stats per thread,
+        # so several routes can search the shared engine at once
+        threads = config.SERVICE_THREADS if threads is None else threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="route")
+        self.started = time.time()
+
+        self._in_flight = {}
+        self.counters = {"requests": 0, "routes": 0, "route_errors": 0, "coalesced": 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def route(self, stops, mode):
+        """Route one request, joining an identical one already in progress."""
+        key = (tuple((round(lat, 6), round(lon, 6)) for lat, lon in stops), mode)
+        task = self._in_flight.get(key)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = asyncio.ensure_future(loop.run_in_executor(self.executor, self._route, stops, mode))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        # Shielded so one client hanging up doesn't cancel the route for the others
+        return await asyncio.shield(task)
+
+    def _route(self, stops, mode):
+        from app.logic.instrumentation import RouteStats
+
+        stats = RouteStats()
+        path, on_road_stops = self.pipeline.route(stops, mode=mode, stats=stats)
+        summary = stats.as_dict()
+        return {
+            "path": path,
+            "stops": on_road_stops,
+            "stats": {"timings_ms": summary["timings_ms"], "counters": summary["counters"]},
+        }
+
+    def health(self):
+        return {"status": "ok", "uptime_s": round(time.time() - self.started, 1), "in_flight": len(self._in_flight)}
+
+    def metrics(self):
+        latencies = list(self.latencies)
+        percentiles = {
+            f"p{q}_ms": round(float(np.percentile(latencies, q)) * 1e3, 3) if latencies else None
+            for q in (50, 95, 99)
+        }
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "in_flight": len(self._in_flight),
+            "counters": dict(self.counters),
+            "route_latency": dict(percentiles, samples=len(latencies)),
+            "graph_cache": self.engine.graph_cache.stats(),
+            "leg_cache": self.engine.leg_cache.stats(),
+            "traffic_cache": self.engine.traffic.stats(),
+            "disk_cache": self.engine.disk_cache.stats(),
+        }
+
+    async def dispatch(self, method, path, body):
+        """``(status, payload)`` for one parsed request."""
+        self.counters["requests"] += 1
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if path == "/health":
+            _require(method, "GET")
+            return 200, self.health()
+        if path == "/metrics":
+            _require(method, "GET")
+            return 200, self.metrics()
+        if path == "/route":
+            _require(method, "POST")
+            stops, mode = _parse_route_request(body)
+            started = time.perf_counter()
+            try:
+                result = await self.route(stops, mode)
+            except Exception as e:
+                self.counters["route_errors"] += 1
+                raise HTTPError(422, str(e))
+            self.counters["routes"] += 1
+            self.latencies.append(time.perf_counter() - started)
+            return 200, result
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+                status, payload = await self.dispatch(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception as e:
+                status, payload = 500, {"error": str(e)}
+            data = json.dumps(payload).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n".encode("ascii") + data
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Routing service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        self.pipeline.shutdown()
+
+
+def _require(method, expected):
+    if method != expected:
+        raise HTTPError(405, f"Use {expected}")
+
+
+def _parse_route_request(body):
+    try:
+        request = json.loads(body or b"{}")
+        stops = [(float(lat), float(lon)) for lat, lon in request["stops"]]
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPError(400, f"Expected {{\"stops\": [[lat, lon], ...]}}: {e}")
+    if len(stops) < 2:
+        raise HTTPError(400, "A route needs at least 2 stops")
+    # Resolved here so requests that differ only by an implied default still coalesce
+    return stops, request.get("mode") or config.SEARCH_MODE
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    try:
+        method, path, _ = request_line.decode("ascii").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            try:
+                length = int(value.strip())
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                raise HTTPError(400, "Malformed Content-Length header")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP routing service.")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--threads", type=int, help=f"routes handled at once (default {config.SERVICE_THREADS})")
+    parser.add_argument("--workers", type=int, help=f"search processes (default {config.ROUTING_WORKERS})")
+    parser.add_argument("--offline", action="store_true",
+                        help="static traffic and cached graphs only, no network access")
+    args = parser.parse_args()
+
+    if args.offline:
+        config.TRAFFIC_PROVIDER = "static"
+        config.ALLOW_DOWNLOADS = False
+
+    service = RoutingService(args.threads, args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()